@@ -0,0 +1,313 @@
+"""
+Incremental low-stock alerts evaluated as each product's inventory arrives.
+
+Rules are plain dicts (e.g. loaded from a JSON file):
+
+    {"id": "xl-low", "type": "variant_below", "threshold": 20, "base_product": "13774", "size": "XL"}
+    {"id": "rich-out", "type": "warehouse_sold_out", "warehouse": "Richmond", "base_product": "13774"}
+    {"id": "drop", "type": "total_drop", "percent": 30}                       # per product
+    {"id": "run-drop", "type": "total_drop", "percent": 30, "scope": "run"}   # whole run
+
+``product`` / ``base_product`` narrow a rule to one product code or style; rules without
+either apply to every product. Drops compare against the totals saved in the state file
+by the previous run.
+
+``warehouse_sold_out`` scoped to a ``product`` checks that colour alone as it arrives;
+otherwise it checks the whole style, summing the warehouse's stock over all of the style's
+colours in the run. Style-wide alerts are therefore only emitted by ``finish()`` of a
+complete run, once every colour has been seen.
+"""
+from __future__ import annotations
+import json
+import os
+import threading
+import time
+from bisect import bisect_right
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import requests
+
+RULE_TYPES = ('variant_below', 'warehouse_sold_out', 'total_drop')
+
+
+class _Bucket:
+    """Rules that share a scope (one product, one style, or everything)"""
+
+    def __init__(self):
+        self.thresholds: List[int] = []
+        self.variant_rules: List[Dict] = []
+        self.warehouse_rules: Dict[str, List[Dict]] = defaultdict(list)
+        self.drop_rules: List[Dict] = []
+
+    def finalize(self):
+        # Sorted by threshold so one bisect finds every rule a stock level breaches
+        pairs = sorted(zip(self.thresholds, range(len(self.variant_rules))))
+        self.variant_rules = [self.variant_rules[i] for _, i in pairs]
+        self.thresholds = [threshold for threshold, _ in pairs]
+
+
+def compile_rules(rules: Iterable[Dict]) -> Tuple[Dict[Tuple[str, str], _Bucket], List[Dict]]:
+    """Validate rules and index them by scope; returns (buckets, run-level rules)"""
+    buckets: Dict[Tuple[str, str], _Bucket] = defaultdict(_Bucket)
+    run_rules: List[Dict] = []
+    for i, rule in enumerate(rules):
+        rule = dict(rule)
+        rule.setdefault('id', f"rule-{i + 1}")
+        kind = rule.get('type')
+        if kind not in RULE_TYPES:
+            raise ValueError(f"Rule {rule['id']}: unknown type {kind!r}; expected one of {RULE_TYPES}")
+
+        if rule.get('product'):
+            scope = ('product', rule['product'])
+        elif rule.get('base_product'):
+            scope = ('base_product', rule['base_product'])
+        else:
+            scope = ('all', '')
+
+        if kind == 'variant_below':
+            bucket = buckets[scope]
+            bucket.thresholds.append(int(rule['threshold']))
+            bucket.variant_rules.append(rule)
+        elif kind == 'warehouse_sold_out':
+            if not rule.get('warehouse'):
+                raise ValueError(f"Rule {rule['id']}: warehouse_sold_out needs a 'warehouse'")
+            buckets[scope].warehouse_rules[str(rule['warehouse']).lower()].append(rule)
+        else:
+            try:
+                rule['percent'] = float(rule['percent'])
+            except (KeyError, TypeError, ValueError):
+                raise ValueError(f"Rule {rule['id']}: total_drop needs a numeric 'percent'") from None
+            if rule.get('scope') == 'run':
+                run_rules.append(rule)
+            else:
+                buckets[scope].drop_rules.append(rule)
+
+    for bucket in buckets.values():
+        bucket.finalize()
+    return dict(buckets), run_rules
+
+
+class FileSink:
+    """Appends alerts as JSON lines"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def emit(self, alert: Dict):
+        with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(alert) + '\n')
+
+
+class WebhookSink:
+    """POSTs each alert as JSON; delivery failures are counted, never raised into the run"""
+
+    def __init__(self, url: str, session: Optional[requests.Session] = None, timeout: float = 5.0):
+        self.url = url
+        self.session = session or requests.Session()
+        self.timeout = timeout
+        self.failures = 0
+
+    def emit(self, alert: Dict):
+        try:
+            self.session.post(self.url, json=alert, timeout=self.timeout).raise_for_status()
+        except Exception:
+            self.failures += 1
+
+
+class ListSink:
+    """Collects alerts in memory, e.g. for display in the UI"""
+
+    def __init__(self):
+        self.alerts: List[Dict] = []
+
+    def emit(self, alert: Dict):
+        self.alerts.append(alert)
+
+
+class CallbackSink:
+    """Calls a function with each alert"""
+
+    def __init__(self, callback: Callable[[Dict], None]):
+        self.callback = callback
+
+    def emit(self, alert: Dict):
+        self.callback(alert)
+
+
+class AlertEngine:
+    """
+    Compiles rules once and evaluates only the rules relevant to each processed product.
+
+    Call ``begin_run()``, then ``evaluate(result)`` per product, then ``finish()``.
+    An alert fires once while its condition holds (tracked across runs through the state
+    file) and can fire again after the condition clears.
+    """
+
+    def __init__(self, rules: Iterable[Dict], sinks: Iterable = (), state_path: Optional[str] = None):
+        self.buckets, self.run_rules = compile_rules(rules)
+        self.sinks = list(sinks)
+        self.state_path = state_path
+        self._lock = threading.Lock()
+        state = self._load_state()
+        self.previous_totals: Dict[str, int] = state.get('product_totals', {})
+        self.previous_run_total: Optional[int] = state.get('run_total')
+        self.active: Set[str] = set(state.get('active', []))
+        self.totals: Dict[str, int] = {}
+        # style -> {'base_product', 'warehouses' (code -> name), 'stock' (warehouse -> product -> units)}
+        self.style_warehouses: Dict[str, Dict] = {}
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs) -> "AlertEngine":
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f), **kwargs)
+
+    def _load_state(self) -> Dict:
+        if self.state_path and os.path.exists(self.state_path):
+            with open(self.state_path, encoding='utf-8') as f:
+                return json.load(f)
+        return {}
+
+    def begin_run(self):
+        with self._lock:
+            self.totals = {}
+            self.style_warehouses = {}
+
+    def evaluate(self, result: Dict) -> List[Dict]:
+        """Check the rules that apply to one product and emit any new alerts"""
+        code = result.get('code', result.get('product_code', ''))
+        base = result.get('base_product', '')
+        style = base or code
+        buckets = [(scope, bucket) for scope, bucket in (
+            ('product', self.buckets.get(('product', code))),
+            ('base_product', self.buckets.get(('base_product', base))),
+            ('all', self.buckets.get(('all', ''))),
+        ) if bucket is not None]
+
+        firing: Dict[str, Dict] = {}
+        total = result.get('total_stock', 0)
+
+        if any(bucket.warehouse_rules for _, bucket in buckets):
+            warehouses = result.get('warehouses') or {}
+            stock_by_warehouse: Dict[str, int] = defaultdict(int)
+            for variant in result.get('variants', []):
+                for location, qty in (variant.get('stock_by_location') or {}).items():
+                    stock_by_warehouse[str(location)] += qty or 0
+            if any(bucket.warehouse_rules for scope, bucket in buckets if scope != 'product'):
+                with self._lock:
+                    seen = self.style_warehouses.setdefault(
+                        style, {'base_product': base, 'warehouses': {}, 'stock': {}})
+                    seen['warehouses'].update(warehouses)
+                    for location, qty in stock_by_warehouse.items():
+                        seen['stock'].setdefault(location, {})[code] = qty
+
+        for scope, bucket in buckets:
+            for variant in result.get('variants', []):
+                stock = variant.get('stock_level', 0)
+                for rule in bucket.variant_rules[bisect_right(bucket.thresholds, stock):]:
+                    if rule.get('size') and rule['size'] != variant.get('size'):
+                        continue
+                    if rule.get('color') and rule['color'] != variant.get('color'):
+                        continue
+                    self._fire(firing, rule, variant.get('code', ''), result,
+                               f"{code} {variant.get('size', '')} {variant.get('color', '')}".strip()
+                               + f" has {stock} units (below {rule['threshold']})", stock)
+
+            if bucket.warehouse_rules and scope == 'product':
+                # Style-wide rules wait for finish(), when every colour of the style has been seen
+                self._fire_sold_out(firing, bucket, code, stock_by_warehouse, warehouses, result)
+
+            for rule in bucket.drop_rules:
+                previous = self.previous_totals.get(code)
+                if previous and (previous - total) * 100 > rule['percent'] * previous:
+                    self._fire(firing, rule, code, result,
+                               f"{code} stock dropped {100 * (previous - total) / previous:.0f}% "
+                               f"({previous} -> {total})", total)
+
+        with self._lock:
+            self.totals[code] = total
+        return self._publish(firing, code)
+
+    def finish(self, complete: bool = True) -> List[Dict]:
+        """
+        Evaluate run-level and style-wide rules and save state. Both need every product, so
+        they are only checked for complete runs.
+        """
+        firing: Dict[str, Dict] = {}
+        run_total = sum(self.totals.values())
+        owners = ['']
+        if complete:
+            previous = self.previous_run_total
+            for rule in self.run_rules:
+                if previous and (previous - run_total) * 100 > rule['percent'] * previous:
+                    self._fire(firing, rule, 'run', {},
+                               f"Total stock dropped {100 * (previous - run_total) / previous:.0f}% "
+                               f"({previous} -> {run_total})", run_total)
+            with self._lock:
+                styles = dict(self.style_warehouses)
+            for style, seen in styles.items():
+                owners.append(f"style:{style}")
+                stock_by_warehouse = {location: sum(stock.values()) for location, stock in seen['stock'].items()}
+                result = {'code': style, 'base_product': seen['base_product']}
+                for bucket in (self.buckets.get(('base_product', seen['base_product'])), self.buckets.get(('all', ''))):
+                    if bucket is not None and bucket.warehouse_rules:
+                        self._fire_sold_out(firing, bucket, style, stock_by_warehouse, seen['warehouses'], result,
+                                            owner=f"style:{style}")
+        alerts = self._publish(firing, *owners) if complete else []
+
+        with self._lock:
+            self.previous_totals.update(self.totals)
+            if complete:
+                self.previous_run_total = run_total
+            state = {
+                'product_totals': self.previous_totals,
+                'run_total': self.previous_run_total,
+                'active': sorted(self.active),
+            }
+        if self.state_path:
+            tmp_path = self.state_path + '.part'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(state, f)
+            os.replace(tmp_path, self.state_path)
+        return alerts
+
+    def _fire_sold_out(self, firing: Dict[str, Dict], bucket: _Bucket, subject: str,
+                       stock_by_warehouse: Dict[str, int], warehouses: Dict[str, str], result: Dict,
+                       owner: Optional[str] = None):
+        for location, qty in stock_by_warehouse.items():
+            if qty > 0:
+                continue
+            for key in {location.lower(), warehouses.get(location, '').lower()} - {''}:
+                for rule in bucket.warehouse_rules.get(key, []):
+                    name = warehouses.get(location, location)
+                    self._fire(firing, rule, f"{subject}@{location}", result,
+                               f"{name} is sold out of {subject}", qty, owner)
+
+    def _fire(self, firing: Dict[str, Dict], rule: Dict, subject: str, result: Dict, message: str, value,
+              owner: Optional[str] = None):
+        product_code = result.get('code', result.get('product_code', ''))
+        # rule|owner|subject, so clearing can be limited to the product (or style) just evaluated
+        firing[f"{rule['id']}|{owner or product_code}|{subject}"] = {
+            'rule_id': rule['id'],
+            'type': rule['type'],
+            'subject': subject,
+            'product_code': product_code,
+            'base_product': result.get('base_product', ''),
+            'value': value,
+            'message': message,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        }
+
+    def _publish(self, firing: Dict[str, Dict], *owners: str) -> List[Dict]:
+        """Emit newly firing alerts; alerts of these owners that stopped firing may fire again later"""
+        with self._lock:
+            cleared = {key for key in self.active if key.split('|', 2)[1] in owners and key not in firing}
+            self.active -= cleared
+            new_keys = [key for key in firing if key not in self.active]
+            self.active.update(new_keys)
+        alerts = [firing[key] for key in new_keys]
+        for alert in alerts:
+            for sink in self.sinks:
+                sink.emit(alert)
+        return alerts
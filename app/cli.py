@@ -0,0 +1,172 @@
+"""
+Headless runner for the SanMar automation.
+
+    python -m app.cli --query polo --output results.json
+    python -m app.cli --query polo --export matrix:csv --export detailed:parquet --profile-dir profiles/
+    python -m app.cli --query polo --record fixtures/polo.jsonl.gz    # capture traffic
+    python -m app.cli --query polo --replay fixtures/polo.jsonl.gz    # offline, no credentials needed
+    python -m app.cli --styles 13774 NKDC1963 --output styles.json   # every colour of each style
+
+Credentials default to SANMAR_USERNAME / SANMAR_PASSWORD from the environment.
+"""
+from __future__ import annotations
+import argparse
+import json
+import logging
+import os
+import shutil
+import signal
+import sys
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+import streamlit as st
+
+from app.alerts import AlertEngine, CallbackSink, FileSink, WebhookSink
+from app.deadline import Deadline
+from app.export import EXPORTS, FORMATS, ExportCache, available_formats, file_name
+from app.http2 import BACKENDS
+from app.profiling import RunProfiler, maybe_stage
+from app.sanmar_automation import SanMarAutomation
+from app.styles import StyleCache
+from app.transport import save_recordings
+
+logger = logging.getLogger("app.cli")
+
+
+@contextmanager
+def streamlit_messages_to_log():
+    """Route st.error/warning/info/success to logging; without a Streamlit session they are dropped"""
+    levels = {'error': logging.ERROR, 'warning': logging.WARNING, 'info': logging.INFO, 'success': logging.INFO}
+    originals = {name: getattr(st, name) for name in levels}
+    for name, level in levels.items():
+        setattr(st, name, lambda body, *args, _level=level, **kwargs: logger.log(_level, "%s", body))
+    try:
+        yield
+    finally:
+        for name, original in originals.items():
+            setattr(st, name, original)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Run SanMar inventory automation without the Streamlit UI")
+    products = parser.add_mutually_exclusive_group(required=True)
+    products.add_argument("--query", help="Category/search text, e.g. polo")
+    products.add_argument("--styles", nargs="+", metavar="STYLE",
+                          help="Check every colour of these styles (base products, style numbers or colour codes)")
+    parser.add_argument("--style-cache", default=".sanmar_style_cache.json", help="Style -> colour map kept between runs")
+    parser.add_argument("--username", default=os.getenv("SANMAR_USERNAME", ""))
+    parser.add_argument("--password", default=os.getenv("SANMAR_PASSWORD", ""))
+    parser.add_argument("--output", help="Write processed results as JSON to this path")
+    parser.add_argument("--export", action="append", default=[], metavar="NAME:FORMAT",
+                        help=f"Export to generate; NAME in {sorted(EXPORTS)}, FORMAT in {sorted(FORMATS)}")
+    parser.add_argument("--export-dir", default=".", help="Directory for --export files")
+    parser.add_argument("--time-budget", type=float, help="Stop fetching after this many seconds and keep partial results")
+    parser.add_argument("--alert-rules", help="JSON file with alert rules (see app/alerts.py)")
+    parser.add_argument("--alert-state", default=".sanmar_alert_state.json", help="Alert state carried between runs")
+    parser.add_argument("--alert-log", help="Append alerts to this JSON-lines file")
+    parser.add_argument("--alert-webhook", help="POST each alert as JSON to this URL")
+    parser.add_argument("--verbose", action="store_true", help="Also log progress messages, not just warnings and errors")
+    parser.add_argument("--profile-dir", help="Profile the run and exports, writing artifacts here")
+    parser.add_argument("--decode-workers", type=int,
+                        help="Processes decoding inventory JSON off the fetch threads (default: SANMAR_DECODE_WORKERS or 0)")
+    parser.add_argument("--max-concurrency", type=int,
+                        help="Ceiling for the adaptive in-flight request limit (default: SANMAR_MAX_CONCURRENCY or 8)")
+    parser.add_argument("--http-backend", choices=BACKENDS, help="Wire protocol (default: SANMAR_HTTP_BACKEND or requests)")
+    transport = parser.add_mutually_exclusive_group()
+    transport.add_argument("--record", metavar="ARCHIVE", help="Record all HTTP exchanges to a .jsonl.gz archive")
+    transport.add_argument("--replay", metavar="ARCHIVE", help="Replay HTTP exchanges from an archive, offline")
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, format="%(levelname)s: %(message)s")
+    exports = []
+    formats = available_formats()
+    for spec in args.export:
+        name, _, fmt = spec.partition(":")
+        if name not in EXPORTS or fmt not in FORMATS:
+            print(f"Invalid --export {spec!r}", file=sys.stderr)
+            return 2
+        if fmt not in formats:
+            # Checked before the run so a missing writer doesn't waste it
+            print(f"--export {spec!r}: {fmt} needs an optional dependency that is not installed "
+                  f"(available: {', '.join(formats)})", file=sys.stderr)
+            return 2
+        exports.append((name, fmt))
+
+    profiler = RunProfiler() if args.profile_dir else None
+    transport = None
+    if args.record:
+        transport = f"record:{args.record}"
+    elif args.replay:
+        transport = f"replay:{args.replay}"
+    automation = SanMarAutomation(transport=transport, http_backend=args.http_backend,
+                                  style_cache=StyleCache(args.style_cache or None),
+                                  max_concurrency=args.max_concurrency, decode_workers=args.decode_workers)
+    query = args.query or "-".join(args.styles)
+
+    alerts = None
+    if args.alert_rules:
+        sinks = [CallbackSink(lambda alert: print(f"ALERT [{alert['rule_id']}] {alert['message']}"))]
+        if args.alert_log:
+            sinks.append(FileSink(args.alert_log))
+        if args.alert_webhook:
+            sinks.append(WebhookSink(args.alert_webhook))
+        alerts = AlertEngine.from_file(args.alert_rules, sinks=sinks, state_path=args.alert_state)
+
+    # Ctrl+C cancels the run but still returns (and writes) the completed products
+    deadline = Deadline(args.time_budget)
+    previous_handler = signal.signal(signal.SIGINT, lambda signum, frame: deadline.cancel())
+    try:
+        with maybe_stage(profiler, "automation"), streamlit_messages_to_log():
+            if args.styles:
+                results = automation.run_style_automation(args.username, args.password, args.styles,
+                                                          deadline=deadline, alerts=alerts)
+            else:
+                results = automation.run_full_automation(args.username, args.password, args.query,
+                                                         deadline=deadline, alerts=alerts)
+    finally:
+        signal.signal(signal.SIGINT, previous_handler)
+        save_recordings(automation.session)
+        # Release the session's connections (and the HTTP/2 backend's event-loop thread) and decode pool
+        automation.close()
+    print(f"Found inventory for {len(results)} products")
+    outcomes = Counter(automation.product_status.values())
+    if outcomes:
+        print("Product status: " + ", ".join(f"{outcome}={count}" for outcome, count in sorted(outcomes.items())))
+    concurrency = automation.limiter.snapshot()
+    print(f"Concurrency: limit={concurrency['limit']}/{concurrency['maximum']}, peak in flight={concurrency['peak_in_flight']}, "
+          f"throttled={concurrency['throttled']}, errors={concurrency['errors']}, decisions={concurrency['decisions']}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Wrote {args.output}")
+
+    if exports:
+        run_id = "cli"
+        timestamp = time.strftime("%Y%m%d_%H%M%S")
+        cache = ExportCache()
+        os.makedirs(args.export_dir, exist_ok=True)
+        try:
+            for name, fmt in exports:
+                with maybe_stage(profiler, f"export:{name}:{fmt}"):
+                    path = cache.file(run_id, name, fmt, results)
+                target = os.path.join(args.export_dir, file_name(name, fmt, query, timestamp))
+                shutil.move(path, target)
+                print(f"Wrote {target}")
+        finally:
+            cache.close()
+
+    if profiler is not None:
+        for path in profiler.write(args.profile_dir):
+            print(f"Wrote {path}")
+
+    return 0 if results else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
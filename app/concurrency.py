@@ -0,0 +1,188 @@
+"""
+Adaptive limit on in-flight SanMar requests (additive increase, multiplicative decrease).
+
+While responses are healthy the limit grows by one each time a full window of ``limit``
+requests succeeds. A 429/503, a timeout/connection error, or latency well above the recent
+baseline cuts it by ``backoff``, at most once per window of requests already in flight,
+so one burst of failures counts as one signal. Throttled responses also pause new requests
+for their ``Retry-After``. The limit always stays within ``[minimum, maximum]``.
+
+    limiter = AdaptiveLimiter(maximum=8)
+    with limiter.slot(deadline) as slot:
+        if slot is not None:
+            response = session.get(url)
+            slot.observe(response)
+"""
+from __future__ import annotations
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterator, List, Optional
+
+# Statuses that mean "slow down" rather than "this request is wrong"
+THROTTLE_STATUSES = (429, 503)
+
+DEFAULT_MAX_CONCURRENCY = 8
+
+# Latency below baseline + this is never treated as congestion (ignores jitter on fast responses)
+MIN_LATENCY_INCREASE = 0.05
+
+# Longest Retry-After pause honoured, so a bogus header cannot stall a run
+MAX_RETRY_AFTER = 30.0
+
+
+def _retry_after(value: Optional[str]) -> float:
+    """Seconds from a Retry-After header (delta-seconds form only)"""
+    try:
+        return min(max(float(value), 0.0), MAX_RETRY_AFTER)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class Slot:
+    """One admitted request; report its response with ``observe`` (exceptions are reported automatically)"""
+
+    def __init__(self, limiter: "AdaptiveLimiter"):
+        self.limiter = limiter
+        self.started = time.monotonic()
+        # Decrease generation when the request started; older requests cannot trigger another cut
+        self.generation = limiter._generation
+        self.status: Optional[int] = None
+        self.retry_after = 0.0
+        # Set when the run's own deadline ended the request; says nothing about the upstream
+        self.cut_off = False
+
+    def observe(self, response):
+        self.status = response.status_code
+        if self.status in THROTTLE_STATUSES:
+            self.retry_after = _retry_after(response.headers.get('Retry-After'))
+
+
+class AdaptiveLimiter:
+    """
+    Thread-safe AIMD concurrency limit.
+
+    ``snapshot()`` and ``decisions`` expose the current limit and every change with its reason
+    for monitoring; ``on_decision`` is called with each new decision.
+    """
+
+    def __init__(self, maximum: int = DEFAULT_MAX_CONCURRENCY, initial: int = 2, minimum: int = 1,
+                 backoff: float = 0.5, latency_tolerance: float = 2.5, baseline_window: int = 50,
+                 throttle_pause: float = 0.5, on_decision=None):
+        if maximum < 1:
+            raise ValueError("maximum concurrency must be at least 1")
+        self.minimum = max(1, min(minimum, maximum))
+        self.maximum = maximum
+        self.limit = max(self.minimum, min(initial, maximum))
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        # Pause after a throttled response without Retry-After
+        self.throttle_pause = throttle_pause
+        self.on_decision = on_decision
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.decisions: List[Dict] = []
+        self.counts: Dict[str, int] = {'ok': 0, 'throttled': 0, 'errors': 0, 'slow': 0}
+        # Recent successful latencies; the baseline is their minimum (an uncongested request)
+        self._latencies: Deque[float] = deque(maxlen=baseline_window)
+        self._successes = 0
+        self._generation = 0
+        self._paused_until = 0.0
+        self._started_at = time.monotonic()
+        self._cond = threading.Condition()
+
+    def acquire(self, deadline=None) -> Optional[Slot]:
+        """Wait for a free slot; None if the deadline expires (or the run is cancelled) first"""
+        with self._cond:
+            while True:
+                if deadline is not None and deadline.expired:
+                    return None
+                wait = self._paused_until - time.monotonic()
+                if wait <= 0 and self.in_flight < self.limit:
+                    break
+                # Wake periodically so deadlines and cancellation are noticed
+                self._cond.wait(min(wait, 0.25) if wait > 0 else 0.25)
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            return Slot(self)
+
+    def release(self, slot: Slot, error: bool = False):
+        latency = time.monotonic() - slot.started
+        with self._cond:
+            self.in_flight -= 1
+            if slot.cut_off:
+                pass
+            elif error or (slot.status is not None and slot.status >= 500 and slot.status not in THROTTLE_STATUSES):
+                self.counts['errors'] += 1
+                self._decrease(slot, 'error')
+            elif slot.status in THROTTLE_STATUSES:
+                self.counts['throttled'] += 1
+                pause = slot.retry_after or self.throttle_pause
+                self._paused_until = max(self._paused_until, time.monotonic() + pause)
+                self._decrease(slot, f"HTTP {slot.status}")
+            else:
+                baseline = min(self._latencies) if self._latencies else None
+                self._latencies.append(latency)
+                if baseline is not None and len(self._latencies) >= 5 and \
+                        latency > max(self.latency_tolerance * baseline, baseline + MIN_LATENCY_INCREASE):
+                    self.counts['slow'] += 1
+                    self._decrease(slot, f"latency {latency * 1000:.0f}ms > "
+                                         f"{self.latency_tolerance:g}x baseline {baseline * 1000:.0f}ms")
+                else:
+                    self.counts['ok'] += 1
+                    # Only requests admitted since the last cut show the new limit is healthy
+                    if slot.generation == self._generation:
+                        self._successes += 1
+                    if self._successes >= self.limit and self.limit < self.maximum:
+                        self._change(self.limit + 1, 'healthy window')
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, deadline=None) -> Iterator[Optional[Slot]]:
+        slot = self.acquire(deadline)
+        if slot is None:
+            yield None
+            return
+        try:
+            yield slot
+        except BaseException:
+            self.release(slot, error=True)
+            raise
+        else:
+            self.release(slot)
+
+    def _decrease(self, slot: Slot, reason: str):
+        # Requests that were already in flight at the last cut report the same congestion
+        if slot.generation != self._generation:
+            return
+        self._generation += 1
+        self._change(max(self.minimum, int(self.limit * self.backoff)), reason)
+
+    def _change(self, new_limit: int, reason: str):
+        self._successes = 0
+        if new_limit == self.limit:
+            return
+        decision = {
+            'time': round(time.monotonic() - self._started_at, 3),
+            'from': self.limit,
+            'to': new_limit,
+            'reason': reason,
+        }
+        self.limit = new_limit
+        self.decisions.append(decision)
+        if self.on_decision is not None:
+            self.on_decision(decision)
+
+    def snapshot(self) -> Dict:
+        """Current state for monitoring"""
+        with self._cond:
+            return {
+                'limit': self.limit,
+                'maximum': self.maximum,
+                'in_flight': self.in_flight,
+                'peak_in_flight': self.peak_in_flight,
+                'baseline_ms': round(min(self._latencies) * 1000, 1) if self._latencies else None,
+                'decisions': len(self.decisions),
+                **self.counts,
+            }
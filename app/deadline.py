@@ -0,0 +1,95 @@
+from __future__ import annotations
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Callable, Optional, TypeVar
+
+T = TypeVar('T')
+
+# Per-request cap when a run has no (or plenty of) budget left
+DEFAULT_REQUEST_TIMEOUT = 25.0
+
+# Requests are not started with less than this much budget left
+MIN_REQUEST_TIMEOUT = 0.05
+
+# How often call() looks for cancellation while waiting
+POLL_INTERVAL = 0.25
+
+
+class DeadlineExceeded(Exception):
+    """The run's time budget is spent or the run was cancelled"""
+
+
+class Deadline:
+    """
+    Run-level time budget plus a cancellation token, shared by every HTTP call in a run.
+
+    ``timeout()`` gives the per-request timeout to pass to requests: the remaining
+    budget, capped at ``request_timeout``. requests applies it to each connect and socket
+    read, not the whole response, so ``call()`` also bounds the wall clock.
+    ``cancel()`` may be called from any thread; work checks it between requests.
+    """
+
+    def __init__(self, seconds: Optional[float] = None, request_timeout: float = DEFAULT_REQUEST_TIMEOUT):
+        self.seconds = seconds
+        self.request_timeout = request_timeout
+        self.expires_at = time.monotonic() + seconds if seconds else None
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left, or None for an unlimited run"""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        remaining = self.remaining()
+        return self.cancelled or (remaining is not None and remaining < MIN_REQUEST_TIMEOUT)
+
+    def check(self):
+        if self.cancelled:
+            raise DeadlineExceeded("Run cancelled")
+        if self.expired:
+            raise DeadlineExceeded(f"Run exceeded its {self.seconds:g}s budget")
+
+    def timeout(self) -> float:
+        """Timeout for the next request; raises DeadlineExceeded if none is left"""
+        self.check()
+        remaining = self.remaining()
+        return self.request_timeout if remaining is None else min(self.request_timeout, remaining)
+
+    def sleep(self, seconds: float):
+        """Sleep, waking early on cancellation and never past the deadline"""
+        remaining = self.remaining()
+        if remaining is not None:
+            seconds = min(seconds, remaining)
+        self._cancelled.wait(seconds)
+
+    def call(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        """
+        ``fn(*args, **kwargs)`` in a daemon thread, waited for until the deadline passes or the
+        run is cancelled; then raises DeadlineExceeded and leaves the call to finish unobserved.
+        """
+        future: Future = Future()
+
+        def target():
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+
+        threading.Thread(target=target, name="deadline-call", daemon=True).start()
+        while True:
+            remaining = self.remaining()
+            try:
+                return future.result(POLL_INTERVAL if remaining is None else min(POLL_INTERVAL, remaining))
+            except FutureTimeout:
+                self.check()
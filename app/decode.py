@@ -0,0 +1,72 @@
+from __future__ import annotations
+import json
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Dict, Optional
+
+from app.processing import process_inventory_data
+
+# Prefer a faster JSON backend when one is installed
+try:
+    import orjson
+
+    JSON_BACKEND = "orjson"
+
+    def loads(raw: bytes) -> Any:
+        return orjson.loads(raw)
+except ImportError:
+    JSON_BACKEND = "json"
+
+    def loads(raw: bytes) -> Any:
+        return json.loads(raw)
+
+
+def decode_inventory(raw: bytes, product_code: str) -> Dict[str, Any]:
+    """Decode a raw checkInventoryJson body and reduce it to the processed form"""
+    return process_inventory_data(loads(raw), product_code)
+
+
+class InventoryDecoder:
+    """
+    Optional decode stage that moves JSON parsing and inventory processing off the I/O threads.
+
+    With ``workers=0`` decoding happens inline in the calling thread. Otherwise raw
+    response bytes are shipped to a process pool and only the compact processed dict
+    comes back, so concurrent fetches are no longer serialized on the GIL.
+    """
+
+    def __init__(self, workers: Optional[int] = None):
+        self.workers = multiprocessing.cpu_count() if workers is None else workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        if self.workers > 0:
+            # spawn keeps children independent of the threads running in the Streamlit server
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+
+    def submit(self, raw: bytes, product_code: str) -> Future:
+        """Schedule a payload for decoding and return a future for the processed dict"""
+        if self._executor is None:
+            future: Future = Future()
+            try:
+                future.set_result(decode_inventory(raw, product_code))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        return self._executor.submit(decode_inventory, raw, product_code)
+
+    def decode(self, raw: bytes, product_code: str) -> Dict[str, Any]:
+        """Decode a payload and block until the processed dict is available"""
+        return self.submit(raw, product_code).result()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def __enter__(self) -> "InventoryDecoder":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
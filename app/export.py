@@ -0,0 +1,275 @@
+from __future__ import annotations
+import os
+import shutil
+import tempfile
+import threading
+import time
+import weakref
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+# Rows written per chunk; keeps peak memory flat regardless of export size
+CHUNK_ROWS = 5000
+
+# Every ExportCache gets a directory under this shared root; directories untouched for
+# STALE_AFTER seconds (e.g. from sessions that ended without cleanup) are removed
+EXPORT_ROOT = os.path.join(tempfile.gettempdir(), 'sanmar_exports')
+STALE_AFTER = 24 * 3600
+
+DETAILED_COLUMNS = [
+    'Product Code', 'Product Name', 'Base Product', 'Variant Code',
+    'Size', 'Color', 'Stock Level', 'URL'
+]
+
+
+def detailed_frame(results: List[Dict]) -> pd.DataFrame:
+    """One row per variant, matching the 'Traditional Detailed Format' export"""
+    rows = []
+    for result in results:
+        product_code = result.get('code', result.get('product_code', ''))
+        product_name = result.get('name', result.get('product_name', ''))
+        for variant in result.get('variants', []):
+            rows.append((
+                product_code,
+                product_name,
+                result.get('base_product', ''),
+                variant.get('code', ''),
+                variant.get('size', ''),
+                variant.get('color', ''),
+                variant.get('stock_level', 0),
+                result.get('url', ''),
+            ))
+    return pd.DataFrame.from_records(rows, columns=DETAILED_COLUMNS)
+
+
+def size_color_crosstab(detailed_df: pd.DataFrame) -> pd.DataFrame:
+    """Format 1: product info as rows, 'Size - Color' combinations as columns"""
+    df = detailed_df.assign(Size_Color=detailed_df['Size'].astype(str) + ' - ' + detailed_df['Color'].astype(str))
+    return df.pivot_table(
+        index=['Product Code', 'Product Name', 'Base Product', 'URL'],
+        columns='Size_Color',
+        values='Stock Level',
+        fill_value=0,
+        aggfunc='sum'
+    ).reset_index()
+
+
+def product_size_crosstab(detailed_df: pd.DataFrame) -> pd.DataFrame:
+    """Format 2: sizes as columns, product × color as rows"""
+    df = detailed_df.assign(Product_Color=detailed_df['Product Code'] + ' - ' + detailed_df['Color'].astype(str))
+    return df.pivot_table(
+        index=['Product_Color', 'Product Code', 'Product Name', 'Color'],
+        columns='Size',
+        values='Stock Level',
+        fill_value=0,
+        aggfunc='sum'
+    ).reset_index()
+
+
+def inventory_matrix(detailed_df: pd.DataFrame) -> pd.DataFrame:
+    """Format 3: complete inventory matrix with a 'Total Stock' column"""
+    df = detailed_df.assign(Size_Color=detailed_df['Size'].astype(str) + ' (' + detailed_df['Color'].astype(str) + ')')
+    matrix = df.pivot_table(
+        index=['Product Code', 'Product Name'],
+        columns='Size_Color',
+        values='Stock Level',
+        fill_value=0,
+        aggfunc='sum'
+    ).reset_index()
+    size_color_cols = [col for col in matrix.columns if col not in ['Product Code', 'Product Name']]
+    matrix['Total Stock'] = matrix[size_color_cols].sum(axis=1)
+    return matrix
+
+
+# name -> (builder from the detailed frame, file name prefix)
+EXPORTS: Dict[str, Tuple[Callable[[pd.DataFrame], pd.DataFrame], str]] = {
+    'size_color': (size_color_crosstab, 'sanmar_crosstab_size_color'),
+    'product_size': (product_size_crosstab, 'sanmar_crosstab_product_size'),
+    'matrix': (inventory_matrix, 'sanmar_inventory_matrix'),
+    'detailed': (lambda df: df, 'sanmar_inventory_detailed'),
+}
+
+
+def _chunks(df: pd.DataFrame):
+    for start in range(0, len(df), CHUNK_ROWS):
+        yield df.iloc[start:start + CHUNK_ROWS]
+
+
+def write_csv(df: pd.DataFrame, path: str):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        df.iloc[:0].to_csv(f, index=False)
+        for chunk in _chunks(df):
+            chunk.to_csv(f, index=False, header=False)
+
+
+def write_xlsx(df: pd.DataFrame, path: str):
+    """Write rows one at a time with a constant-memory workbook (xlsxwriter or openpyxl)"""
+    columns = [str(col) for col in df.columns]
+    try:
+        import xlsxwriter
+    except ImportError:
+        xlsxwriter = None
+
+    if xlsxwriter is not None:
+        workbook = xlsxwriter.Workbook(path, {'constant_memory': True})
+        sheet = workbook.add_worksheet('Inventory')
+        sheet.write_row(0, 0, columns)
+        row_num = 1
+        for chunk in _chunks(df):
+            for row in chunk.itertuples(index=False, name=None):
+                sheet.write_row(row_num, 0, [_cell(value) for value in row])
+                row_num += 1
+        workbook.close()
+        return
+
+    try:
+        from openpyxl import Workbook
+    except ImportError as e:
+        raise ImportError("XLSX export requires xlsxwriter or openpyxl (pip install xlsxwriter)") from e
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Inventory')
+    sheet.append(columns)
+    for chunk in _chunks(df):
+        for row in chunk.itertuples(index=False, name=None):
+            sheet.append([_cell(value) for value in row])
+    workbook.save(path)
+
+
+def write_parquet(df: pd.DataFrame, path: str):
+    """Write the frame as a series of row groups"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("Parquet export requires pyarrow (pip install pyarrow)") from e
+    # Parquet column names must be strings
+    df = df.rename(columns=str)
+    # Infer types from the first chunk; an empty frame would give untyped columns
+    schema = pa.Schema.from_pandas(df.iloc[:CHUNK_ROWS], preserve_index=False)
+    with pq.ParquetWriter(path, schema) as writer:
+        for chunk in _chunks(df):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+
+def _cell(value: Any) -> Any:
+    # numpy scalars are not understood by the spreadsheet writers
+    return value.item() if hasattr(value, 'item') else value
+
+
+# format -> (writer, file extension, mime type)
+FORMATS: Dict[str, Tuple[Callable[[pd.DataFrame, str], None], str, str]] = {
+    'csv': (write_csv, 'csv', 'text/csv'),
+    'xlsx': (write_xlsx, 'xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'parquet': (write_parquet, 'parquet', 'application/vnd.apache.parquet'),
+}
+
+
+def available_formats() -> List[str]:
+    """Formats whose optional writer dependencies are installed"""
+    formats = ['csv']
+    for fmt, modules in (('xlsx', ('xlsxwriter', 'openpyxl')), ('parquet', ('pyarrow',))):
+        for module in modules:
+            try:
+                __import__(module)
+            except ImportError:
+                continue
+            formats.append(fmt)
+            break
+    return formats
+
+
+class ExportCache:
+    """
+    Lazily builds export frames and files for a run, keyed by run ID.
+
+    Frames are pivoted once per run and reused across page interactions; files are
+    written to a temp directory only when an export is requested and then served from
+    disk until the run is dropped.
+    """
+
+    def __init__(self, root: Optional[str] = None):
+        if root is None:
+            os.makedirs(EXPORT_ROOT, exist_ok=True)
+            remove_stale_exports()
+            root = tempfile.mkdtemp(prefix='session_', dir=EXPORT_ROOT)
+        self.root = root
+        # Removes the directory when the cache is closed or garbage collected (session ended)
+        self._finalizer = weakref.finalize(self, shutil.rmtree, root, True)
+        self._frames: Dict[Tuple[str, str], pd.DataFrame] = {}
+        self._files: Dict[Tuple[str, str, str], str] = {}
+        self._lock = threading.Lock()
+
+    def frame(self, run_id: str, name: str, results: List[Dict]) -> pd.DataFrame:
+        """Return the frame for an export, building it (and the detailed frame) at most once"""
+        key = (run_id, name)
+        with self._lock:
+            if key in self._frames:
+                return self._frames[key]
+        if name == 'detailed':
+            df = detailed_frame(results)
+        else:
+            builder = EXPORTS[name][0]
+            df = builder(self.frame(run_id, 'detailed', results))
+        with self._lock:
+            return self._frames.setdefault(key, df)
+
+    def has_file(self, run_id: str, name: str, fmt: str) -> bool:
+        path = self._files.get((run_id, name, fmt))
+        return path is not None and os.path.exists(path)
+
+    def file(self, run_id: str, name: str, fmt: str, results: List[Dict]) -> str:
+        """Return the path of the export file, writing it on first request"""
+        key = (run_id, name, fmt)
+        with self._lock:
+            # The file may have been removed by stale-directory cleanup; rewrite it then
+            if key in self._files and os.path.exists(self._files[key]):
+                return self._files[key]
+        writer, ext = FORMATS[fmt][0], FORMATS[fmt][1]
+        run_dir = os.path.join(self.root, run_id)
+        os.makedirs(run_dir, exist_ok=True)
+        path = os.path.join(run_dir, f"{name}.{ext}")
+        tmp_path = path + '.part'
+        writer(self.frame(run_id, name, results), tmp_path)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._files[key] = path
+        return path
+
+    def drop_run(self, run_id: str):
+        """Forget all frames and files generated for a run"""
+        with self._lock:
+            self._frames = {k: v for k, v in self._frames.items() if k[0] != run_id}
+            self._files = {k: v for k, v in self._files.items() if k[0] != run_id}
+        shutil.rmtree(os.path.join(self.root, run_id), ignore_errors=True)
+
+    def keep_only(self, run_id: str):
+        """Drop every run except the given one"""
+        run_ids = {k[0] for k in self._frames} | {k[0] for k in self._files}
+        for other in run_ids - {run_id}:
+            self.drop_run(other)
+
+    def close(self):
+        """Drop every run and remove the cache directory"""
+        with self._lock:
+            self._frames, self._files = {}, {}
+        self._finalizer()
+
+
+def remove_stale_exports(root: str = EXPORT_ROOT, max_age: float = STALE_AFTER):
+    """Remove cache directories under root that have not been modified for max_age seconds"""
+    cutoff = time.time() - max_age
+    try:
+        entries = list(os.scandir(root))
+    except OSError:
+        return
+    for entry in entries:
+        try:
+            if entry.is_dir() and entry.stat().st_mtime < cutoff:
+                shutil.rmtree(entry.path, ignore_errors=True)
+        except OSError:
+            continue
+
+
+def file_name(name: str, fmt: str, query: str, timestamp: str) -> str:
+    return f"{EXPORTS[name][1]}_{query}_{timestamp}.{FORMATS[fmt][1]}"
@@ -0,0 +1,188 @@
+"""
+Optional HTTP/2 backend for requests sessions, built on httpx (``pip install "httpx[http2]"``).
+
+``Http2Adapter`` is a requests transport adapter, so Session headers, cookies, redirects,
+timeouts and exceptions behave exactly as with the default backend; only the wire
+protocol changes. Concurrent requests from any number of threads are multiplexed as
+streams over a few connections, and HPACK compresses the repeated browser-like headers.
+
+Requests run on httpx's async client in one event-loop thread owned by the adapter:
+httpx's sync HTTP/2 connections are not safe to share between threads (stream IDs can be
+sent out of order, which servers answer with a PROTOCOL_ERROR and close the connection).
+"""
+from __future__ import annotations
+import asyncio
+import os
+import ssl
+import threading
+from http import HTTPStatus
+from typing import Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.utils import select_proxy
+
+from app.transport import buffered_response
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+BACKENDS = ('requests', 'http2', 'h2c')
+
+# Connection-specific headers are not allowed in HTTP/2 and are redundant for httpx's HTTP/1.1
+_HOP_BY_HOP = {'connection', 'keep-alive', 'proxy-connection', 'transfer-encoding', 'upgrade'}
+
+
+def http2_available() -> bool:
+    if httpx is None:
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class Http2Adapter(HTTPAdapter):
+    """
+    Sends requests over HTTP/2 via a shared httpx client.
+
+    ``prior_knowledge=True`` speaks HTTP/2 without TLS/ALPN negotiation (h2c), which is
+    what local test servers usually offer; otherwise HTTP/2 is negotiated over TLS and
+    plain-HTTP/1.1 servers still work.
+
+    ``verify``, ``cert`` and ``proxies`` (including Session.proxies and the environment
+    proxies requests resolves) are honoured through one httpx client per combination.
+    Bodies are always read in full, so ``stream=True`` responses are served from memory.
+    """
+
+    def __init__(self, max_connections: int = 4, prior_knowledge: bool = False):
+        if not http2_available():
+            raise ImportError('The HTTP/2 backend requires httpx with HTTP/2 support: pip install "httpx[http2]"')
+        super().__init__()
+        self.max_connections = max_connections
+        self.prior_knowledge = prior_knowledge
+        self._clients: Dict[object, "httpx.AsyncClient"] = {}
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def _event_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="http2-adapter", daemon=True)
+                self._thread.start()
+            return self._loop
+
+    def _client(self, verify, cert, proxy: Optional[str]) -> "httpx.AsyncClient":
+        # httpx fixes TLS settings and the proxy per client, requests passes them per call; only used on the loop thread
+        verify = verify if isinstance(verify, (bool, str)) else True
+        cert = tuple(cert) if isinstance(cert, (list, tuple)) else cert
+        key = (verify, cert, proxy)
+        client = self._clients.get(key)
+        if client is None:
+            client = httpx.AsyncClient(
+                http2=True,
+                http1=not self.prior_knowledge,
+                verify=_ssl_context(verify, cert),
+                proxy=proxy,
+                trust_env=False,  # requests has already applied the environment (proxies, CA bundle)
+                follow_redirects=False,  # requests.Session handles redirects itself
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections),
+            )
+            self._clients[key] = client
+        return client
+
+    @staticmethod
+    def _timeout(timeout) -> "httpx.Timeout":
+        if isinstance(timeout, tuple):
+            connect, read = timeout
+            return httpx.Timeout(read, connect=connect)
+        return httpx.Timeout(timeout)
+
+    async def _request(self, request, timeout, verify, cert, proxy) -> "httpx.Response":
+        return await self._client(verify, cert, proxy).request(
+            request.method,
+            request.url,
+            headers=[(k, v) for k, v in request.headers.items() if k.lower() not in _HOP_BY_HOP],
+            content=request.body,
+            timeout=self._timeout(timeout),
+        )
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        proxy = select_proxy(request.url, proxies) if proxies else None
+        future = asyncio.run_coroutine_threadsafe(self._request(request, timeout, verify, cert, proxy),
+                                                  self._event_loop())
+        try:
+            response = future.result()
+        except httpx.ProxyError as e:
+            raise requests.exceptions.ProxyError(e, request=request) from e
+        except httpx.ConnectTimeout as e:
+            raise requests.exceptions.ConnectTimeout(e, request=request) from e
+        except httpx.TimeoutException as e:
+            raise requests.exceptions.ReadTimeout(e, request=request) from e
+        except httpx.ConnectError as e:
+            if proxy is not None:
+                # requests reports failing to reach the proxy as ProxyError
+                raise requests.exceptions.ProxyError(e, request=request) from e
+            raise requests.exceptions.ConnectionError(e, request=request) from e
+        except httpx.HTTPError as e:
+            raise requests.exceptions.RequestException(e, request=request) from e
+
+        # HTTP/2 has no reason phrase; use the standard one like http.client would show
+        reason = response.reason_phrase or _standard_reason(response.status_code)
+        result = buffered_response(self, request, response.status_code, reason,
+                                   response.headers.multi_items(), response.content)
+        result.http_version = response.http_version
+        return result
+
+    def connection_count(self) -> int:
+        """Open connections across all clients (for monitoring and tests)"""
+        return sum(len(client._transport._pool.connections) for client in list(self._clients.values()))
+
+    def close(self):
+        with self._lock:
+            loop, thread, self._loop, self._thread = self._loop, self._thread, None, None
+        if loop is not None:
+            clients, self._clients = list(self._clients.values()), {}
+            for client in clients:
+                asyncio.run_coroutine_threadsafe(client.aclose(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
+        super().close()
+
+
+def _ssl_context(verify, cert) -> ssl.SSLContext:
+    """SSL context matching requests' ``verify`` (bool or CA bundle/directory) and ``cert`` arguments"""
+    if isinstance(verify, str):
+        context = ssl.create_default_context(**{'capath' if os.path.isdir(verify) else 'cafile': verify})
+    else:
+        context = httpx.create_ssl_context(verify=verify, trust_env=False)
+    if cert:
+        if isinstance(cert, tuple):
+            context.load_cert_chain(*cert)
+        else:
+            context.load_cert_chain(cert)
+    return context
+
+
+def _standard_reason(status: int) -> str:
+    try:
+        return HTTPStatus(status).phrase
+    except ValueError:
+        return ''
+
+
+def backend_adapter(backend: Optional[str]) -> Tuple[str, Optional[HTTPAdapter]]:
+    """Adapter for 'requests' (None: keep the default), 'http2' or 'h2c' (HTTP/2 prior knowledge)"""
+    backend = (backend or 'requests').lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown HTTP backend {backend!r}; expected one of {BACKENDS}")
+    if backend == 'requests':
+        return backend, None
+    return backend, Http2Adapter(prior_knowledge=backend == 'h2c')
@@ -0,0 +1,98 @@
+from __future__ import annotations
+import time
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+
+def short_name(result: Dict, limit: int = 30) -> str:
+    """Product name truncated the way the stock chart labels it"""
+    name = result.get('product_name', result.get('name', 'Unknown'))
+    return name[:limit] + "..." if len(name) > limit else name
+
+
+class LiveAggregates:
+    """
+    Summary metrics, per-product stock and the inventory matrix, maintained as results arrive.
+
+    Each ``add`` only touches the row of the product being added (replacing any earlier
+    contribution from the same product code) and registers any new size/color columns,
+    so nothing is re-aggregated from scratch while a run is in progress.
+    """
+
+    def __init__(self):
+        self.total_products = 0
+        self.total_variants = 0
+        self.total_stock = 0
+        self.in_stock_products = 0
+        # product code -> (label, total stock) for the chart
+        self.product_stock: Dict[str, Tuple[str, int]] = {}
+        # (product code, product name) -> {'Size (Color)': stock}
+        self.matrix_rows: Dict[Tuple[str, str], Dict[str, int]] = {}
+        self.matrix_columns: Dict[str, None] = {}
+        self._by_code: Dict[str, Dict] = {}
+
+    def add(self, result: Dict):
+        code = result.get('code', result.get('product_code', ''))
+        previous = self._by_code.get(code)
+        if previous is not None:
+            self._apply(previous, -1)
+        self._by_code[code] = result
+        self._apply(result, 1)
+
+    def _apply(self, result: Dict, sign: int):
+        code = result.get('code', result.get('product_code', ''))
+        name = result.get('name', result.get('product_name', ''))
+        variants = result.get('variants', [])
+        stock = result.get('total_stock', 0)
+
+        self.total_products += sign
+        self.total_variants += sign * len(variants)
+        self.total_stock += sign * stock
+        self.in_stock_products += sign * (1 if stock > 0 else 0)
+
+        if sign < 0:
+            self.product_stock.pop(code, None)
+            self.matrix_rows.pop((code, name), None)
+            return
+
+        self.product_stock[code] = (short_name(result), stock)
+        row: Dict[str, int] = {}
+        for variant in variants:
+            column = f"{variant.get('size', '')} ({variant.get('color', '')})"
+            row[column] = row.get(column, 0) + variant.get('stock_level', 0)
+            self.matrix_columns.setdefault(column, None)
+        self.matrix_rows[(code, name)] = row
+
+    def chart_frame(self) -> pd.DataFrame:
+        labels = [label for label, _ in self.product_stock.values()]
+        stock = [value for _, value in self.product_stock.values()]
+        return pd.DataFrame({'Product': labels, 'Total Stock': stock})
+
+    def matrix_frame(self) -> pd.DataFrame:
+        """Same layout as app.export.inventory_matrix, built from the maintained rows"""
+        columns = sorted(self.matrix_columns)
+        records: List[list] = []
+        for (code, name), row in sorted(self.matrix_rows.items()):
+            values = [row.get(column, 0) for column in columns]
+            records.append([code, name] + values + [sum(values)])
+        return pd.DataFrame(records, columns=['Product Code', 'Product Name'] + columns + ['Total Stock'])
+
+
+class Throttle:
+    """Allows an action at most once per ``interval`` seconds or every ``every`` calls"""
+
+    def __init__(self, interval: float = 1.0, every: Optional[int] = None):
+        self.interval = interval
+        self.every = every
+        self._last = 0.0
+        self._pending = 0
+
+    def ready(self) -> bool:
+        self._pending += 1
+        now = time.monotonic()
+        if now - self._last >= self.interval or (self.every and self._pending >= self.every):
+            self._last = now
+            self._pending = 0
+            return True
+        return False
@@ -0,0 +1,84 @@
+from __future__ import annotations
+from typing import Any, Dict, List
+
+
+def process_inventory_data(inventory_data: Dict[str, Any], product_code: str) -> Dict[str, Any]:
+    """
+    Reduce a raw checkInventoryJson payload to the compact form used by the app.
+    Kept free of Streamlit/requests imports so it can run inside worker processes.
+    """
+    product = inventory_data.get('product') or {}
+    processed = {
+        'product_code': product_code,
+        'product_name': product.get('name', 'Unknown'),
+        'base_product': product.get('baseProduct', ''),
+        'style_number': product.get('styleNumber') or '',
+        # Every colour of the style, so its siblings can be fetched without searching
+        'color_options': color_options(product),
+        # warehouse code (the stock_by_location keys) -> display name, e.g. '3' -> 'Dallas'
+        'warehouses': {
+            str(warehouse.get('code')): warehouse.get('shortName') or warehouse.get('name') or ''
+            for warehouse in inventory_data.get('warehouses') or []
+            if warehouse.get('code') is not None
+        },
+        'variants': []
+    }
+
+    # Process variant options (sizes, colors, etc.)
+    variant_options = product.get('variantOptions') or []
+
+    total_stock = 0
+    for variant in variant_options:
+        variant_info = {
+            'code': variant.get('code', ''),
+            'size': '',
+            'color': '',
+            'stock_level': (variant.get('stock') or {}).get('stockLevel', 0) or 0,
+            'stock_by_location': variant.get('stockLevelsMap') or {},
+            'available_stock': variant.get('availableStockMap') or {}
+        }
+
+        # Extract size and color from qualifiers
+        for qualifier in variant.get('variantOptionQualifiers') or []:
+            if qualifier.get('qualifier') == 'size':
+                variant_info['size'] = qualifier.get('value', '')
+            elif qualifier.get('qualifier') in ['color', 'colourCategoryCode']:
+                variant_info['color'] = qualifier.get('value', '')
+
+        total_stock += variant_info['stock_level']
+        processed['variants'].append(variant_info)
+
+    processed['total_stock'] = total_stock
+    return processed
+
+
+def _option_color(option: Dict[str, Any]) -> str:
+    for qualifier in option.get('variantOptionQualifiers') or []:
+        if qualifier.get('qualifier') in ['color', 'colourCategoryCode']:
+            return qualifier.get('value') or ''
+    return ''
+
+
+def color_options(product: Dict[str, Any]) -> List[Dict[str, str]]:
+    """
+    Colour variants of the product's style as [{'code', 'color', 'url'}], from ``baseOptions``
+    (colour variant options) or, when those are missing, the top level of ``variantMatrix``.
+    """
+    base = product.get('baseProduct') or ''
+    options = []
+    for base_option in product.get('baseOptions') or []:
+        variant_type = base_option.get('variantType') or ''
+        if 'Colour' in variant_type or 'Color' in variant_type:
+            options.extend(base_option.get('options') or [])
+    if not options:
+        # The matrix nests colour -> size; colour variants are the top-level elements
+        options = [element.get('variantOption') or {} for element in product.get('variantMatrix') or []]
+
+    colors, seen = [], set()
+    for option in options:
+        code = option.get('code') or ''
+        if not code or code in seen or (base and not code.startswith(f"{base}_")):
+            continue
+        seen.add(code)
+        colors.append({'code': code, 'color': _option_color(option), 'url': option.get('url') or f"/p/{code}"})
+    return colors
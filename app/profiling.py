@@ -0,0 +1,190 @@
+from __future__ import annotations
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+# Frames from these files are profiler plumbing, not application work
+_IGNORED_FILES = (os.path.abspath(__file__), tracemalloc.__file__, threading.__file__)
+
+# tracemalloc is process-wide; stages (possibly from several sessions) share it and the
+# last one to finish stops it, unless something else had started it already
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+_tracing_started = False
+
+
+def _start_tracing(frames: int):
+    global _tracing_users, _tracing_started
+    with _tracing_lock:
+        if _tracing_users == 0:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(frames)
+                _tracing_started = True
+            tracemalloc.reset_peak()
+        _tracing_users += 1
+        return tracemalloc.take_snapshot()
+
+
+def _stop_tracing():
+    """Snapshot and peak for the finishing stage; stops tracing when no stage is left"""
+    global _tracing_users, _tracing_started
+    with _tracing_lock:
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        _tracing_users -= 1
+        if _tracing_users == 0 and _tracing_started:
+            tracemalloc.stop()
+            _tracing_started = False
+        return snapshot, peak
+
+
+class _StackSampler(threading.Thread):
+    """
+    Samples Python stacks at a fixed interval and counts them in folded form.
+
+    Samples the thread that started the stage plus any thread created while it runs
+    (e.g. fetch workers), but not threads that already existed, such as the server's.
+    """
+
+    def __init__(self, stage: str, owner: int, interval: float, counts: Counter):
+        super().__init__(name=f"profiler-{stage}", daemon=True)
+        self.stage = stage
+        self.owner = owner
+        self.interval = interval
+        self.counts = counts
+        self.preexisting = {t.ident for t in threading.enumerate()} - {owner}
+        self._stop_event = threading.Event()
+
+    def run(self):
+        names = {}
+        while not self._stop_event.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == self.ident or ident in self.preexisting:
+                    continue
+                if ident not in names:
+                    thread = threading._active.get(ident)
+                    names[ident] = thread.name if thread else str(ident)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    if code.co_filename not in _IGNORED_FILES:
+                        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                if stack:
+                    stack.reverse()
+                    self.counts[";".join([self.stage, names[ident]] + stack)] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class RunProfiler:
+    """
+    Opt-in CPU and memory profiling for automation runs and export stages.
+
+    Each ``stage`` is profiled with cProfile, a wall-clock stack sampler and tracemalloc.
+    Artifacts:
+      - ``profile.folded``: folded stacks, loadable by flamegraph.pl, speedscope or inferno;
+        includes the threads the stage starts, such as the inventory fetch workers
+      - ``<stage>.pstats``: cProfile stats for the thread that ran the stage only (for the
+        automation that is mostly waiting on the workers; use the folded stacks for them)
+      - ``allocations.txt``: top allocations and peak traced memory per stage; tracemalloc
+        is process-wide, so stages that overlap (e.g. two sessions) see each other's memory
+    """
+
+    def __init__(self, sample_interval: float = 0.005, top: int = 25, frames: int = 10):
+        self.sample_interval = sample_interval
+        self.top = top
+        self.frames = frames
+        self.folded: Counter = Counter()
+        self.pstats: Dict[str, bytes] = {}
+        self.allocation_reports: List[str] = []
+        self.timings: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str):
+        """Profile the enclosed block under ``name``"""
+        before = _start_tracing(self.frames)
+
+        profiler = cProfile.Profile()
+        counts: Counter = Counter()
+        sampler = _StackSampler(name, threading.get_ident(), self.sample_interval, counts)
+        sampler.start()
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            yield self
+        finally:
+            profiler.disable()
+            elapsed = time.perf_counter() - start
+            sampler.stop()
+            after, peak = _stop_tracing()
+            self._record(name, elapsed, profiler, counts, before, after, peak)
+
+    def _record(self, name, elapsed, profiler, counts, before, after, peak):
+        stats_file = io.BytesIO()
+        stats = pstats.Stats(profiler)
+        # Same format as Stats.dump_stats, which only writes to a path
+        stats_file.write(marshal.dumps(stats.stats))
+
+        filters = [tracemalloc.Filter(False, path) for path in _IGNORED_FILES]
+        diff = after.filter_traces(filters).compare_to(before.filter_traces(filters), 'traceback')
+        lines = [f"== {name}: {elapsed:.2f}s wall, peak traced memory {peak / 1024 / 1024:.1f} MiB"]
+        for stat in diff[:self.top]:
+            if stat.size_diff <= 0:
+                continue
+            lines.append(f"{stat.size_diff / 1024:10.1f} KiB  {stat.count_diff:+8d} blocks")
+            lines.extend(f"    {line}" for line in stat.traceback.format(limit=self.frames))
+
+        with self._lock:
+            self.timings[name] = elapsed
+            self.folded.update(counts)
+            self.pstats[name] = stats_file.getvalue()
+            self.allocation_reports.append("\n".join(lines))
+
+    def artifacts(self) -> Dict[str, bytes]:
+        """Return file name -> content for every artifact collected so far"""
+        with self._lock:
+            files = {
+                'profile.folded': "".join(f"{stack} {count}\n" for stack, count in sorted(self.folded.items())).encode(),
+                'allocations.txt': ("\n\n".join(self.allocation_reports) + "\n").encode(),
+            }
+            for name, data in self.pstats.items():
+                files[f"{_safe_name(name)}.pstats"] = data
+        return files
+
+    def write(self, output_dir: str) -> List[str]:
+        """Write all artifacts to ``output_dir`` and return their paths"""
+        os.makedirs(output_dir, exist_ok=True)
+        paths = []
+        for file_name, data in self.artifacts().items():
+            path = os.path.join(output_dir, file_name)
+            with open(path, 'wb') as f:
+                f.write(data)
+            paths.append(path)
+        return paths
+
+
+@contextmanager
+def maybe_stage(profiler: Optional[RunProfiler], name: str):
+    """``profiler.stage(name)`` when profiling is enabled, otherwise a no-op"""
+    if profiler is None:
+        yield None
+    else:
+        with profiler.stage(name):
+            yield profiler
+
+
+def _safe_name(name: str) -> str:
+    return "".join(ch if ch.isalnum() or ch in '-_.' else '_' for ch in name)
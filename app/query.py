@@ -0,0 +1,196 @@
+from __future__ import annotations
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Columns of a variant row, in the order they are stored and returned
+FIELDS = ('product_code', 'product_name', 'base_product', 'variant_code', 'size', 'color', 'stock_level')
+
+# Fields with an equality index usable in Query.where
+INDEXED_FIELDS = ('product_code', 'base_product', 'size', 'color')
+
+
+class _SortedIndex:
+    """Row ids sorted by a numeric key, for range lookups with bisect"""
+
+    def __init__(self, pairs: Iterable[Tuple[int, int]]):
+        pairs = sorted(pairs)
+        self.keys = [key for key, _ in pairs]
+        self.rows = [row for _, row in pairs]
+
+    def between(self, low: Optional[int], high: Optional[int]) -> List[int]:
+        start = 0 if low is None else bisect_left(self.keys, low)
+        end = len(self.keys) if high is None else bisect_right(self.keys, high)
+        return self.rows[start:end]
+
+
+class InventoryIndex:
+    """
+    In-memory, indexed view over processed inventory results (one row per variant).
+
+    Built once per run from the output of ``_process_inventory_data`` (merged with the
+    search product info). Keeps hash indexes on product, base product, size and color,
+    plus sorted stock indexes for the variant total, each warehouse, and each
+    product/color total, so filters resolve by set intersection instead of scans.
+    """
+
+    def __init__(self, results: List[Dict]):
+        self.columns: Dict[str, list] = {field: [] for field in FIELDS}
+        self.stock_by_location: List[Dict[str, int]] = []
+        self.warehouse_names: Dict[str, str] = {}
+        self._equality: Dict[str, Dict[str, Set[int]]] = {field: defaultdict(set) for field in INDEXED_FIELDS}
+        warehouse_pairs: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        color_rows: Dict[Tuple[str, str], List[int]] = defaultdict(list)
+
+        for result in results:
+            product_code = result.get('code', result.get('product_code', ''))
+            product_name = result.get('name', result.get('product_name', ''))
+            base_product = result.get('base_product', '')
+            self.warehouse_names.update(result.get('warehouses') or {})
+            for variant in result.get('variants', []):
+                row = len(self.stock_by_location)
+                values = (
+                    product_code, product_name, base_product, variant.get('code', ''),
+                    variant.get('size', ''), variant.get('color', ''), variant.get('stock_level', 0) or 0,
+                )
+                for field, value in zip(FIELDS, values):
+                    self.columns[field].append(value)
+                for field in INDEXED_FIELDS:
+                    self._equality[field][self.columns[field][row]].add(row)
+
+                locations = {str(code): qty or 0 for code, qty in (variant.get('stock_by_location') or {}).items()}
+                self.stock_by_location.append(locations)
+                for code, qty in locations.items():
+                    warehouse_pairs[code].append((qty, row))
+                color_rows[(product_code, values[5])].append(row)
+
+        stock = self.columns['stock_level']
+        self._stock = _SortedIndex((qty, row) for row, qty in enumerate(stock))
+        self._warehouse = {code: _SortedIndex(pairs) for code, pairs in warehouse_pairs.items()}
+        # Total stock of each product/color, expanded back to the rows of that color
+        self._color_stock = _SortedIndex(
+            (sum(stock[row] for row in rows), row)
+            for rows in color_rows.values()
+            for row in rows
+        )
+        self._all = range(len(self.stock_by_location))
+
+    def __len__(self) -> int:
+        return len(self.stock_by_location)
+
+    def values(self, field: str) -> List[str]:
+        """Distinct values of an indexed field, sorted"""
+        return sorted(self._equality[field])
+
+    def warehouse_code(self, warehouse: str) -> Optional[str]:
+        """Resolve a warehouse code or (case-insensitive) name such as 'Richmond'"""
+        if warehouse in self._warehouse:
+            return warehouse
+        wanted = warehouse.strip().lower()
+        for code, name in self.warehouse_names.items():
+            if name.lower() == wanted:
+                return code
+        return None
+
+    def query(self) -> "Query":
+        return Query(self)
+
+    def rows(self, row_ids: Iterable[int]) -> List[Dict]:
+        """Variants as dicts with FIELDS plus 'stock_by_location'"""
+        columns = self.columns
+        return [
+            dict({field: columns[field][row] for field in FIELDS},
+                 stock_by_location=self.stock_by_location[row])
+            for row in row_ids
+        ]
+
+
+class Query:
+    """
+    Chainable filter/sort over an InventoryIndex; every filter narrows the result.
+
+        index.query().where(size='XL').stock(min=50).rows()
+        index.query().warehouse_stock('Richmond', min=1).sort('stock_level', descending=True).rows()
+        index.query().color_stock(max=0).products()
+    """
+
+    def __init__(self, index: InventoryIndex):
+        self.index = index
+        self._candidates: List[Iterable[int]] = []
+        self._sort: Optional[Tuple[str, bool]] = None
+        self._limit: Optional[int] = None
+
+    def where(self, **criteria) -> "Query":
+        """Equality filters on indexed fields; a list/tuple/set value matches any of its items"""
+        for field, value in criteria.items():
+            if field not in INDEXED_FIELDS:
+                raise ValueError(f"{field!r} is not indexed; use one of {INDEXED_FIELDS}")
+            index = self.index._equality[field]
+            if isinstance(value, (list, tuple, set, frozenset)):
+                rows: Set[int] = set()
+                for item in value:
+                    rows |= index.get(item, set())
+                self._candidates.append(rows)
+            else:
+                self._candidates.append(index.get(value, set()))
+        return self
+
+    def stock(self, min: Optional[int] = None, max: Optional[int] = None) -> "Query":
+        """Variant total stock within [min, max]"""
+        self._candidates.append(self.index._stock.between(min, max))
+        return self
+
+    def warehouse_stock(self, warehouse: str, min: Optional[int] = None, max: Optional[int] = None) -> "Query":
+        """Stock at one warehouse (code or name) within [min, max]"""
+        code = self.index.warehouse_code(warehouse)
+        sorted_index = self.index._warehouse.get(code) if code is not None else None
+        self._candidates.append(sorted_index.between(min, max) if sorted_index else [])
+        return self
+
+    def color_stock(self, min: Optional[int] = None, max: Optional[int] = None) -> "Query":
+        """Variants whose product/color total is within [min, max]; max=0 finds sold-out colors"""
+        self._candidates.append(self.index._color_stock.between(min, max))
+        return self
+
+    def sort(self, field: str, descending: bool = False) -> "Query":
+        if field not in FIELDS:
+            raise ValueError(f"Unknown sort field {field!r}")
+        self._sort = (field, descending)
+        return self
+
+    def limit(self, count: int) -> "Query":
+        self._limit = count
+        return self
+
+    def row_ids(self) -> List[int]:
+        if not self._candidates:
+            ids: Iterable[int] = self.index._all
+        else:
+            # Intersect starting from the most selective filter
+            ordered = sorted(self._candidates, key=len)
+            result = set(ordered[0])
+            for candidate in ordered[1:]:
+                if not result:
+                    break
+                result.intersection_update(candidate)
+            ids = result
+
+        if self._sort is not None:
+            field, descending = self._sort
+            column = self.index.columns[field]
+            ids = sorted(ids, key=column.__getitem__, reverse=descending)
+        else:
+            ids = sorted(ids)
+        return ids if self._limit is None else ids[:self._limit]
+
+    def count(self) -> int:
+        return len(self.row_ids())
+
+    def rows(self) -> List[Dict]:
+        """Matching variants as dicts with FIELDS plus 'stock_by_location'"""
+        return self.index.rows(self.row_ids())
+
+    def products(self) -> List[str]:
+        """Distinct product codes of the matching variants, in result order"""
+        codes = self.index.columns['product_code']
+        return list(dict.fromkeys(codes[row] for row in self.row_ids()))
@@ -1,9 +1,19 @@
+import os
 import requests
-import time
 import re
-from typing import Dict, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional, Tuple
 from urllib.parse import urljoin, urlparse, parse_qs
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+from app.alerts import AlertEngine
+from app.concurrency import DEFAULT_MAX_CONCURRENCY, THROTTLE_STATUSES, AdaptiveLimiter
+from app.deadline import Deadline, DeadlineExceeded
+from app.decode import InventoryDecoder
+from app.processing import process_inventory_data
+from app.styles import StyleCache, style_products
+from app.transport import configure_session
 
 # Robust BeautifulSoup import with fallback
 try:
@@ -13,11 +23,44 @@ except ImportError as e:
     st.stop()
 
 
+class _NullStatus:
+    def update(self, **kwargs):
+        pass
+
+
 class SanMarAutomation:
-    def __init__(self):
+    def __init__(self, decoder=None, transport: Optional[str] = None, base_url: Optional[str] = None,
+                 http_backend: Optional[str] = None, style_cache: Optional[StyleCache] = None,
+                 max_concurrency: Optional[int] = None, decode_workers: Optional[int] = None):
         self.session = requests.Session()
-        self.base_url = "https://www.sanmar.com"
+        # SANMAR_BASE_URL points the app at a stand-in server, e.g. for load tests
+        self.base_url = (base_url or os.getenv("SANMAR_BASE_URL") or "https://www.sanmar.com").rstrip('/')
         self.logged_in = False
+        # Optional app.decode.InventoryDecoder; when set, JSON decoding runs off-thread.
+        # decode_workers (defaults to SANMAR_DECODE_WORKERS) > 0 creates one that close() shuts down
+        self._owns_decoder = False
+        if decoder is None:
+            workers = decode_workers if decode_workers is not None else int(os.getenv("SANMAR_DECODE_WORKERS") or 0)
+            if workers > 0:
+                decoder = InventoryDecoder(workers=workers)
+                self._owns_decoder = True
+        self.decoder = decoder
+        # 'live', 'record:PATH' or 'replay:PATH' (defaults to SANMAR_TRANSPORT); see app.transport
+        # http_backend: 'requests', 'http2' or 'h2c' (defaults to SANMAR_HTTP_BACKEND); see app.http2
+        self.transport_mode = configure_session(self.session, transport, http_backend)
+        # Inventory requests in flight adapt to SanMar's latency and throttling, up to this ceiling
+        # (defaults to SANMAR_MAX_CONCURRENCY); see app.concurrency
+        self.limiter = AdaptiveLimiter(
+            maximum=max_concurrency or int(os.getenv("SANMAR_MAX_CONCURRENCY") or DEFAULT_MAX_CONCURRENCY)
+        )
+        # Throttled (429/503) inventory requests are retried this many times after backing off
+        self.throttle_retries = 2
+        # Time budget and cancellation token for the current run; bounds every request timeout
+        self.deadline = Deadline()
+        # product code -> 'ok' | 'timed_out' | 'skipped' | 'failed' for the last run
+        self.product_status: Dict[str, str] = {}
+        # Style -> colour map for run_style_automation; pass a shared StyleCache to reuse it across runs
+        self.style_cache = style_cache or StyleCache()
         
         # Set default headers
         self.session.headers.update({
@@ -36,12 +79,18 @@ class SanMarAutomation:
             'Priority': 'u=0, i'
         })
 
+    def close(self):
+        """Release the session's connections and any decode pool this automation created"""
+        self.session.close()
+        if self._owns_decoder:
+            self.decoder.close()
+
     def login(self, username: str, password: str) -> bool:
         """Login to SanMar website"""
         try:
             # First, get the login page to retrieve any necessary tokens/cookies
             login_url = f"{self.base_url}/login"
-            response = self.session.get(login_url)
+            response = self.deadline.call(self.session.get, login_url, timeout=self.deadline.timeout())
             
             if response.status_code != 200:
                 st.error(f"Failed to access login page: {response.status_code}")
@@ -73,7 +122,8 @@ class SanMarAutomation:
                 'Pragma': 'no-cache'
             }
             
-            response = self.session.post(login_post_url, data=login_data, headers=headers, allow_redirects=True)
+            response = self.deadline.call(self.session.post, login_post_url, data=login_data, headers=headers,
+                                          allow_redirects=True, timeout=self.deadline.timeout())
             
             # Check if login was successful by examining the final URL and content
             if self._is_logged_in(response):
@@ -87,6 +137,8 @@ class SanMarAutomation:
                 self.logged_in = True  # Set to true to allow search to proceed
                 return True
                 
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             st.error(f"Login error: {str(e)}")
             # Even if login fails, let's try to proceed
@@ -167,7 +219,8 @@ class SanMarAutomation:
                 'sort': 'relevance'
             }
             
-            response = self.session.post(search_api_url, json=search_data, headers=headers)
+            response = self.deadline.call(self.session.post, search_api_url, json=search_data, headers=headers,
+                                          timeout=self.deadline.timeout())
             
             if response.status_code == 200:
                 try:
@@ -186,7 +239,8 @@ class SanMarAutomation:
                 'pageSize': 50
             }
             
-            response = self.session.get(search_url, params=params)
+            response = self.deadline.call(self.session.get, search_url, params=params,
+                                          timeout=self.deadline.timeout())
             
             if response.status_code != 200:
                 st.error(f"Search failed: {response.status_code}")
@@ -198,6 +252,8 @@ class SanMarAutomation:
             st.info(f"Found {len(products)} products for category: {category_query}")
             return products
             
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             st.error(f"Search error: {str(e)}")
             return []
@@ -377,7 +433,8 @@ class SanMarAutomation:
         return unique_products
 
     def get_product_inventory(self, product_code: str) -> Dict:
-        """Get inventory information for a specific product"""
+        """Get inventory information for a specific product; the outcome is kept in product_status"""
+        self.product_status[product_code] = 'failed'
         try:
             # Build inventory check URL
             inventory_url = f"{self.base_url}/p/{product_code}/checkInventoryJson"
@@ -392,12 +449,43 @@ class SanMarAutomation:
                 'X-Requested-With': 'XMLHttpRequest'
             }
             
-            response = self.session.get(inventory_url, headers=headers)
+            for attempt in range(self.throttle_retries + 1):
+                with self.limiter.slot(self.deadline) as slot:
+                    if slot is None or self.deadline.expired:
+                        if slot is not None:
+                            slot.cut_off = True
+                        if attempt == 0:
+                            # Never sent: the budget ran out before (or while) waiting for a free slot
+                            self.product_status[product_code] = 'skipped'
+                            return {}
+                        break  # keep the last throttled response
+                    # Not deadline.timeout(): it raises DeadlineExceeded, which the slot would count as an error
+                    timeout = self.deadline.request_timeout
+                    remaining = self.deadline.remaining()
+                    if remaining is not None:
+                        timeout = min(timeout, remaining)
+                    try:
+                        response = self.deadline.call(self.session.get, inventory_url, headers=headers,
+                                                      timeout=timeout)
+                    except DeadlineExceeded:
+                        slot.cut_off = True
+                        raise
+                    except requests.Timeout:
+                        # A timeout shortened by the budget is not a sign of upstream trouble
+                        slot.cut_off = timeout < self.deadline.request_timeout
+                        raise
+                    slot.observe(response)
+                if response.status_code not in THROTTLE_STATUSES:
+                    break
             
             if response.status_code == 200:
                 try:
-                    inventory_data = response.json()
-                    return self._process_inventory_data(inventory_data, product_code)
+                    if self.decoder is not None:
+                        inventory = self.decoder.decode(response.content, product_code)
+                    else:
+                        inventory = self._process_inventory_data(response.json(), product_code)
+                    self.product_status[product_code] = 'ok'
+                    return inventory
                 except Exception as e:
                     st.warning(f"Failed to parse inventory JSON for {product_code}: {str(e)}")
                     return {}
@@ -407,65 +495,141 @@ class SanMarAutomation:
             elif response.status_code == 403:
                 st.warning(f"Access forbidden for inventory check on {product_code}")
                 return {}
+            elif response.status_code in THROTTLE_STATUSES:
+                st.warning(f"Inventory check for {product_code} still throttled after {self.throttle_retries} retries")
+                return {}
             else:
                 st.warning(f"Inventory check failed for {product_code}: HTTP {response.status_code}")
                 return {}
                 
+        except (requests.Timeout, DeadlineExceeded) as e:
+            self.product_status[product_code] = 'timed_out'
+            st.warning(f"Inventory check for {product_code} cut off: {str(e)}")
+            return {}
         except Exception as e:
             st.warning(f"Inventory check error for {product_code}: {str(e)}")
             return {}
 
     def _process_inventory_data(self, inventory_data: Dict, product_code: str) -> Dict:
         """Process raw inventory data into a simplified format"""
-        processed = {
-            'product_code': product_code,
-            'product_name': inventory_data.get('product', {}).get('name', 'Unknown'),
-            'base_product': inventory_data.get('product', {}).get('baseProduct', ''),
-            'variants': []
-        }
+        return process_inventory_data(inventory_data, product_code)
+
+    def expand_style(self, style: str) -> Tuple[List[Dict], Optional[Dict]]:
+        """
+        Colour products of a style (base product, colour code or style number) and, unless the
+        style was cached, the inventory of the colour whose response listed them.
+        """
+        entry = self.style_cache.get(style)
+        if entry is not None:
+            return style_products(entry), None
         
-        # Process variant options (sizes, colors, etc.)
-        variant_options = inventory_data.get('product', {}).get('variantOptions', [])
+        # Colour codes and base products serve their own inventory; style numbers need a search
+        probe = style
+        if '_' not in style and not style.isdigit():
+            # A text search can rank other styles first; only trust a result naming this style
+            needle = style.lower()
+            matches = [match for match in self.search_category(style)
+                       if needle in match.get('code', '').lower() or needle in match.get('name', '').lower()]
+            if not matches:
+                st.warning(f"No search result matches style {style}")
+                self.product_status[style] = 'failed'
+                return [], None
+            probe = matches[0]['code']
         
-        total_stock = 0
-        for variant in variant_options:
-            variant_info = {
-                'code': variant.get('code', ''),
-                'size': '',
-                'color': '',
-                'stock_level': variant.get('stock', {}).get('stockLevel', 0),
-                'stock_by_location': variant.get('stockLevelsMap', {}),
-                'available_stock': variant.get('availableStockMap', {})
-            }
-            
-            # Extract size and color from qualifiers
-            for qualifier in variant.get('variantOptionQualifiers', []):
-                if qualifier.get('qualifier') == 'size':
-                    variant_info['size'] = qualifier.get('value', '')
-                elif qualifier.get('qualifier') in ['color', 'colourCategoryCode']:
-                    variant_info['color'] = qualifier.get('value', '')
-            
-            total_stock += variant_info['stock_level']
-            processed['variants'].append(variant_info)
+        inventory = self.get_product_inventory(probe)
+        if not inventory:
+            return [], None
+        if probe != style and inventory.get('style_number') and inventory['style_number'].lower() != style.lower():
+            st.warning(f"{probe} belongs to style {inventory['style_number']}, not {style}")
+            self.product_status.pop(probe, None)
+            self.product_status[style] = 'failed'
+            return [], None
+        entry = self.style_cache.put(inventory, style)
+        products = style_products(entry)
+        if probe not in {product['code'] for product in products}:
+            # e.g. a base product answered with one of its colours; that colour gets fetched again
+            self.product_status.pop(probe, None)
+            return products, None
+        return products, inventory
+
+    def run_full_automation(self, username: str, password: str, category_query: str,
+                            on_result: Optional[Callable[[Dict], None]] = None,
+                            deadline: Optional[Deadline] = None,
+                            alerts: Optional[AlertEngine] = None) -> List[Dict]:
+        """
+        Run the complete automation: login, search, and check inventory for all products.
+        ``on_result`` is called with each product's inventory as soon as it is fetched.
+        With a ``deadline``, the run stops when its budget is spent or it is cancelled and
+        returns what completed; ``product_status`` says what happened to each product.
+        ``alerts`` evaluates each product against its alert rules as it arrives.
+        """
+        def find_products() -> Tuple[List[Dict], Dict[str, Dict]]:
+            st.write(f"🔍 Searching for category: {category_query}")
+            return self.search_category(category_query), {}
         
-        processed['total_stock'] = total_stock
-        return processed
+        return self._run(username, password, find_products, on_result, deadline, alerts)
 
-    def run_full_automation(self, username: str, password: str, category_query: str) -> List[Dict]:
-        """Run the complete automation: login, search, and check inventory for all products"""
+    def run_style_automation(self, username: str, password: str, styles: List[str],
+                             on_result: Optional[Callable[[Dict], None]] = None,
+                             deadline: Optional[Deadline] = None,
+                             alerts: Optional[AlertEngine] = None) -> List[Dict]:
+        """
+        Like ``run_full_automation``, but checks every colour of the given styles instead of
+        searching. Each uncached style costs one discovery request, whose inventory is kept.
+        """
+        def find_products() -> Tuple[List[Dict], Dict[str, Dict]]:
+            st.write(f"🎨 Expanding {len(styles)} styles into their colours...")
+            products, prefetched = [], {}
+            for style in styles:
+                if self.deadline.expired:
+                    self.product_status.setdefault(style, 'skipped')
+                    continue
+                try:
+                    colors, inventory = self.expand_style(style)
+                except DeadlineExceeded:
+                    # Keep the styles expanded so far
+                    self.product_status.setdefault(style, 'timed_out')
+                    continue
+                known = {product['code'] for product in products}
+                products.extend(product for product in colors if product['code'] not in known)
+                if inventory:
+                    prefetched[inventory['product_code']] = inventory
+            if products:
+                st.info(f"Found {len(products)} colours for {len(styles)} styles")
+            return products, prefetched
+        
+        return self._run(username, password, find_products, on_result, deadline, alerts)
+
+    def _run(self, username: str, password: str,
+             find_products: Callable[[], Tuple[List[Dict], Dict[str, Dict]]],
+             on_result: Optional[Callable[[Dict], None]],
+             deadline: Optional[Deadline],
+             alerts: Optional[AlertEngine]) -> List[Dict]:
+        """Login, find products (plus any inventory already fetched on the way), then check the rest"""
         results = []
+        self.deadline = deadline or Deadline()
+        self.product_status = {}
+        if alerts is not None:
+            alerts.begin_run()
         
         with st.status("Running SanMar automation...", expanded=True) as status:
-            # Step 1: Login
-            st.write("🔐 Logging into SanMar...")
-            if not self.login(username, password):
-                status.update(label="❌ Automation failed", state="error")
+            # st.status yields None when running headless (no Streamlit script context)
+            if status is None:
+                status = _NullStatus()
+            try:
+                # Step 1: Login
+                st.write("🔐 Logging into SanMar...")
+                if not self.login(username, password):
+                    status.update(label="❌ Automation failed", state="error")
+                    return results
+                
+                # Step 2: Find products
+                products, prefetched = find_products()
+            except DeadlineExceeded as e:
+                st.warning(f"Stopped before checking inventory: {e}")
+                status.update(label="⏱️ Automation stopped early! No inventory checked", state="complete")
                 return results
             
-            # Step 2: Search category
-            st.write(f"🔍 Searching for category: {category_query}")
-            products = self.search_category(category_query)
-            
             if not products:
                 st.write("❌ No products found")
                 status.update(label="⚠️ No products found", state="complete")
@@ -475,21 +639,55 @@ class SanMarAutomation:
             st.write(f"📦 Checking inventory for {len(products)} products...")
             
             progress_bar = st.progress(0)
-            for i, product in enumerate(products):
-                progress = (i + 1) / len(products)
-                progress_bar.progress(progress)
-                
-                st.write(f"Checking inventory for: {product['name']}")
-                
-                inventory = self.get_product_inventory(product['code'])
+            found: Dict[int, Dict] = {}
+            completed = 0
+            
+            def record(index: int, product: Dict, inventory: Dict):
+                nonlocal completed
+                completed += 1
+                progress_bar.progress(completed / len(products))
                 if inventory:
+                    st.write(f"Checked inventory for: {product['name']}")
                     inventory.update(product)  # Merge product info with inventory
-                    results.append(inventory)
-                
-                # Add a small delay to be respectful to the server
-                time.sleep(0.5)
-            
-            status.update(label=f"✅ Automation complete! Found inventory for {len(results)} products", state="complete")
+                    found[index] = inventory
+                    if alerts is not None:
+                        alerts.evaluate(inventory)
+                    if on_result is not None:
+                        on_result(inventory)
+            
+            # Fetch concurrently; the limiter decides how many requests are actually in flight.
+            # Workers get this script's context so their st.warning calls reach the page.
+            with ThreadPoolExecutor(max_workers=self.limiter.maximum, thread_name_prefix="sanmar-inventory",
+                                    initializer=add_script_run_ctx, initargs=(None, get_script_run_ctx())) as pool:
+                pending = {}
+                try:
+                    for i, product in enumerate(products):
+                        inventory = prefetched.pop(product['code'], None)
+                        if inventory is not None:
+                            record(i, product, inventory)
+                        else:
+                            pending[pool.submit(self.get_product_inventory, product['code'])] = (i, product)
+                    for future in as_completed(pending):
+                        record(*pending[future], future.result())
+                except BaseException:
+                    # e.g. Streamlit stopping the script: stop queued fetches and wind down running ones
+                    self.deadline.cancel()
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    raise
+            results = [found[i] for i in sorted(found)]
+            
+            skipped = sum(1 for product in products if self.product_status.get(product['code']) == 'skipped')
+            if skipped:
+                st.write(f"⏱️ Stopped early; skipped {skipped} products")
+            
+            if alerts is not None:
+                # Run-level rules only compare complete runs
+                alerts.finish(complete=all(outcome == 'ok' for outcome in self.product_status.values()))
+            
+            if any(outcome != 'ok' for outcome in self.product_status.values()) and self.deadline.expired:
+                status.update(label=f"⏱️ Automation stopped early! Found inventory for {len(results)} products", state="complete")
+            else:
+                status.update(label=f"✅ Automation complete! Found inventory for {len(results)} products", state="complete")
         
         return results
 
@@ -1,10 +1,14 @@
 from __future__ import annotations
+import atexit
 import os
 import json
-from typing import Dict, List, Any
-import requests
+from typing import Dict, List, Any, Optional
 from urllib.parse import quote_plus
 
+import requests
+
+from app.transport import configure_session
+
 DEFAULT_HEADERS = {
     "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126 Safari/537.36",
     "Accept": "application/json, text/plain, */*",
@@ -30,10 +34,26 @@ def _build_headers_for_query(query: str) -> Dict[str, str]:
     return headers
 
 
-def find_products(query: str, page: int = 0, page_size: int = 24, sort: str = "relevance") -> Dict[str, Any]:
+_session: Optional[requests.Session] = None
+
+
+def _default_session() -> requests.Session:
+    """Module-wide session using the transport from SANMAR_TRANSPORT (live by default)"""
+    global _session
+    if _session is None:
+        session = requests.Session()
+        if configure_session(session) == 'record':
+            # Nothing else owns this session; closing it writes the archive
+            atexit.register(session.close)
+        _session = session
+    return _session
+
+
+def find_products(query: str, page: int = 0, page_size: int = 24, sort: str = "relevance",
+                  session: Optional[requests.Session] = None) -> Dict[str, Any]:
     """
     Calls SanMar search endpoint to find products by text query.
-    Returns raw JSON payload.
+    Returns raw JSON payload. Pass ``session`` to use a specific (e.g. replaying) transport.
     """
     url = "https://www.sanmar.com/search/findProducts.json"
     body = {
@@ -44,7 +64,7 @@ def find_products(query: str, page: int = 0, page_size: int = 24, sort: str = "r
         # Keep payload minimal; filters/facets can be added if needed
     }
     headers = _build_headers_for_query(query)
-    resp = requests.post(url, headers=headers, json=body, timeout=25)
+    resp = (session or _default_session()).post(url, headers=headers, json=body, timeout=25)
     resp.raise_for_status()
     try:
         return resp.json()
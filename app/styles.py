@@ -0,0 +1,100 @@
+"""
+Style -> colour map used by style-expansion runs.
+
+Every checkInventoryJson payload lists all colours of its style (``baseOptions``), so one
+response is enough to fetch the whole style directly. The map is cached here, optionally
+in a JSON file, so later runs skip even that discovery request.
+"""
+from __future__ import annotations
+import json
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Optional
+
+# Colour ranges change seasonally; entries older than this are rediscovered
+DEFAULT_MAX_AGE = 7 * 24 * 3600
+
+
+def parse_styles(text: str) -> List[str]:
+    """Style numbers, base products or colour codes separated by commas, spaces or newlines"""
+    styles = []
+    for style in re.split(r'[\s,;]+', text):
+        if style and style not in styles:
+            styles.append(style)
+    return styles
+
+
+def base_of(code: str) -> str:
+    """Base product of a colour code, e.g. '13774_TeamRed' -> '13774'"""
+    return code.split('_', 1)[0]
+
+
+class StyleCache:
+    """
+    Thread-safe map from a style to its colour options.
+
+    Entries are keyed by base product; style numbers (e.g. NKDC1963), the identifiers users
+    typed and the colour codes themselves are kept as aliases for that key.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_age: float = DEFAULT_MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        state = self._load()
+        self.styles: Dict[str, Dict] = state.get('styles', {})
+        self.aliases: Dict[str, str] = state.get('aliases', {})
+
+    def _load(self) -> Dict:
+        if self.path and os.path.exists(self.path):
+            try:
+                with open(self.path, encoding='utf-8') as f:
+                    return json.load(f)
+            except (OSError, ValueError):
+                return {}
+        return {}
+
+    def get(self, style: str) -> Optional[Dict]:
+        """Cached entry ({'base_product', 'name', 'colors', 'updated'}) for any alias, if still fresh"""
+        with self._lock:
+            key = self.aliases.get(style, style)
+            entry = self.styles.get(key)
+            if entry is None and '_' in style:
+                entry = self.styles.get(base_of(style))
+        if entry is None or time.time() - entry.get('updated', 0) > self.max_age:
+            return None
+        return entry
+
+    def put(self, inventory: Dict, *aliases: str) -> Dict:
+        """Store the colours listed in a processed inventory result; returns the cache entry"""
+        code = inventory.get('code', inventory.get('product_code', ''))
+        base = inventory.get('base_product') or base_of(code)
+        colors = inventory.get('color_options') or [{'code': code, 'color': '', 'url': f"/p/{code}"}]
+        entry = {
+            'base_product': base,
+            'name': inventory.get('product_name', inventory.get('name', '')),
+            'colors': colors,
+            'updated': time.time(),
+        }
+        with self._lock:
+            self.styles[base] = entry
+            for alias in (*aliases, inventory.get('style_number', '')):
+                if alias and alias != base:
+                    self.aliases[alias] = base
+            state = {'styles': self.styles, 'aliases': self.aliases}
+            if self.path:
+                tmp_path = self.path + '.part'
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(state, f)
+                os.replace(tmp_path, self.path)
+        return entry
+
+
+def style_products(entry: Dict) -> List[Dict]:
+    """One product per colour, in the shape search results use ({'url', 'name', 'code'})"""
+    return [
+        {'url': color['url'], 'name': entry['name'], 'code': color['code']}
+        for color in entry['colors']
+    ]
@@ -0,0 +1,317 @@
+"""
+Record-and-replay HTTP transport for requests sessions.
+
+Mount with ``configure_session(session, "record:path.jsonl.gz")`` to capture every
+exchange into a gzip-compressed JSON-lines archive, or ``"replay:path.jsonl.gz"`` to
+serve the recorded responses from memory with no network access. The spec can also
+come from the SANMAR_TRANSPORT environment variable.
+"""
+from __future__ import annotations
+import base64
+import gzip
+import hashlib
+import io
+import json
+import os
+import threading
+from collections import defaultdict
+from http.client import HTTPMessage
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from urllib3.response import HTTPResponse
+
+ARCHIVE_FORMAT = "sanmar-http-archive"
+# 2: headers are a list of [name, value] pairs (1 stored a dict, which merged repeated headers)
+ARCHIVE_VERSION = 2
+
+# Stored bodies are already decoded, so these would no longer be accurate
+_DROPPED_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding'}
+
+# Form fields left out of body hashes, so a hash cannot be used to guess a password
+CREDENTIAL_FIELDS = {'j_username', 'j_password', 'csrftoken', 'username', 'password'}
+
+REDACTED = 'redacted'
+
+
+class ReplayMiss(requests.exceptions.ConnectionError):
+    """Raised when replaying and no recorded response matches the request"""
+
+
+def _normalize_url(url: str) -> str:
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((parts.scheme, parts.netloc.lower(), parts.path, query, ''))
+
+
+def _header_pairs(headers) -> List[Tuple[str, str]]:
+    """Header pairs in order, from a pair list or (version 1 archives, callers) a mapping"""
+    if headers is None:
+        return []
+    if hasattr(headers, 'items'):
+        headers = headers.items()
+    return [(name, value) for name, value in headers]
+
+
+def _redact_cookie(value: str) -> str:
+    """Set-Cookie value with the cookie's value replaced; name and attributes are kept"""
+    cookie, sep, attributes = value.partition(';')
+    name, _, _ = cookie.partition('=')
+    return f"{name.strip()}={REDACTED}{sep}{attributes}"
+
+
+def _body_hash(body) -> str:
+    if body is None:
+        return ''
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    if not isinstance(body, bytes):
+        return ''
+    try:
+        fields = parse_qsl(body.decode('utf-8'), keep_blank_values=True)
+    except UnicodeDecodeError:
+        fields = []
+    if any(name.lower() in CREDENTIAL_FIELDS for name, _ in fields):
+        # A login form: match on its other fields (usually none, i.e. on the URL)
+        body = urlencode(sorted((name, value) for name, value in fields
+                                if name.lower() not in CREDENTIAL_FIELDS)).encode('utf-8')
+    return hashlib.sha1(body).hexdigest()
+
+
+class Archive:
+    """
+    Ordered request/response exchanges, matched by method, normalized URL and body hash.
+
+    Request bodies are stored only as hashes, without login form fields, and Set-Cookie
+    values are redacted, so neither passwords nor session cookies end up in an archive.
+    An archive is never consumed: each replay reads it through its own ``ArchiveCursor``,
+    so several sessions can share one loaded archive and still replay deterministically.
+    """
+
+    def __init__(self, entries: Optional[List[Dict]] = None):
+        self.entries: List[Dict] = []
+        self._by_key: Dict[Tuple[str, str, str], List[Dict]] = defaultdict(list)
+        self._by_url: Dict[Tuple[str, str], List[Dict]] = defaultdict(list)
+        self._lock = threading.Lock()
+        for entry in entries or []:
+            self._index(entry)
+
+    def _index(self, entry: Dict):
+        self.entries.append(entry)
+        self._by_key[(entry['method'], entry['url'], entry['body_sha1'])].append(entry)
+        self._by_url[(entry['method'], entry['url'])].append(entry)
+
+    def add(self, method: str, url: str, status: int, content: bytes,
+            headers: Union[Dict[str, str], Iterable[Tuple[str, str]], None] = None, reason: str = '', body=None):
+        """Append an exchange; also the way to turn a saved payload into a fixture"""
+        entry = {
+            'method': method.upper(),
+            'url': _normalize_url(url),
+            'body_sha1': _body_hash(body),
+            'status': status,
+            'reason': reason,
+            # Pairs rather than a dict so repeated headers (Set-Cookie) survive
+            'headers': [[k, _redact_cookie(v) if k.lower() == 'set-cookie' else v]
+                        for k, v in _header_pairs(headers) if k.lower() not in _DROPPED_HEADERS],
+        }
+        try:
+            entry['text'] = content.decode('utf-8')
+        except UnicodeDecodeError:
+            entry['base64'] = base64.b64encode(content).decode('ascii')
+        with self._lock:
+            self._index(entry)
+
+    def candidates(self, method: str, url: str, body=None) -> Tuple[Tuple, List[Dict]]:
+        """(key, recorded exchanges) for a request, falling back to method + URL if the body differs"""
+        method, url = method.upper(), _normalize_url(url)
+        key = (method, url, _body_hash(body))
+        with self._lock:
+            if self._by_key.get(key):
+                return key, self._by_key[key]
+            return (method, url), self._by_url.get((method, url), [])
+
+    def cursor(self) -> "ArchiveCursor":
+        return ArchiveCursor(self)
+
+    @staticmethod
+    def content(entry: Dict) -> bytes:
+        if 'base64' in entry:
+            return base64.b64decode(entry['base64'])
+        return entry.get('text', '').encode('utf-8')
+
+    @classmethod
+    def load(cls, path: str) -> "Archive":
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            header = json.loads(f.readline())
+            if header.get('format') != ARCHIVE_FORMAT:
+                raise ValueError(f"{path} is not a {ARCHIVE_FORMAT} file")
+            return cls([json.loads(line) for line in f if line.strip()])
+
+    def save(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = path + '.part'
+        with self._lock, gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            f.write(json.dumps({'format': ARCHIVE_FORMAT, 'version': ARCHIVE_VERSION}) + '\n')
+            for entry in self.entries:
+                f.write(json.dumps(entry, separators=(',', ':')) + '\n')
+        os.replace(tmp_path, path)
+
+
+class ArchiveCursor:
+    """
+    One replay's position in a shared archive. Repeated identical requests get their
+    responses in recorded order, repeating the last one once exhausted.
+    """
+
+    def __init__(self, archive: Archive):
+        self.archive = archive
+        self._positions: Dict[Tuple, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def match(self, method: str, url: str, body=None) -> Optional[Dict]:
+        """Next recorded exchange for a request"""
+        key, entries = self.archive.candidates(method, url, body)
+        if not entries:
+            return None
+        with self._lock:
+            position = self._positions[key]
+            self._positions[key] = position + 1
+        return entries[min(position, len(entries) - 1)]
+
+
+class RecordingAdapter(BaseAdapter):
+    """
+    Sends through ``inner`` (a normal HTTPAdapter by default) and records every exchange.
+    Recording starts a new archive at ``path`` unless ``append`` is set.
+    """
+
+    def __init__(self, path: str, inner: Optional[BaseAdapter] = None, append: bool = False):
+        super().__init__()
+        self.path = path
+        self.inner = inner or HTTPAdapter()
+        self.archive = Archive.load(path) if append and os.path.exists(path) else Archive()
+
+    def send(self, request, **kwargs):
+        response = self.inner.send(request, **kwargs)
+        # The raw headers keep every value of a repeated header; response.headers joins them
+        raw_headers = getattr(response.raw, 'headers', None)
+        headers = raw_headers.items() if raw_headers is not None else response.headers.items()
+        self.archive.add(request.method, request.url, response.status_code, response.content,
+                         headers, response.reason or '', request.body)
+        return response
+
+    def save(self):
+        self.archive.save(self.path)
+
+    def close(self):
+        self.save()
+        self.inner.close()
+
+
+class _BufferedMessage:
+    """
+    Stand-in for the http.client response urllib3 normally wraps.
+    requests reads Set-Cookie headers from its ``msg``, so cookies still reach the session.
+    """
+
+    def __init__(self, method: str, headers: Iterable[Tuple[str, str]]):
+        self._method = method
+        self.msg = HTTPMessage()
+        for name, value in headers:
+            self.msg[name] = value
+
+    def isclosed(self) -> bool:
+        return False
+
+    def close(self):
+        pass
+
+
+def buffered_response(adapter: HTTPAdapter, request, status: int, reason: str,
+                      headers: Iterable[Tuple[str, str]], content: bytes) -> requests.Response:
+    """
+    Build a requests.Response from an already-read, already-decoded body, exactly as
+    HTTPAdapter would for a live response (cookies, encoding, url, history hooks).
+    """
+    headers = [(name, value) for name, value in headers if name.lower() not in _DROPPED_HEADERS]
+    raw = HTTPResponse(
+        body=io.BytesIO(content),
+        headers=headers,
+        status=status,
+        reason=reason,
+        preload_content=False,
+        decode_content=False,
+        original_response=_BufferedMessage(request.method, headers),
+    )
+    return adapter.build_response(request, raw)
+
+
+class ReplayAdapter(HTTPAdapter):
+    """Serves responses from an archive without touching the network"""
+
+    def __init__(self, archive: Archive):
+        super().__init__()
+        self.archive = archive
+        self.cursor = archive.cursor()
+
+    def send(self, request, **kwargs):
+        entry = self.cursor.match(request.method, request.url, request.body)
+        if entry is None:
+            raise ReplayMiss(f"No recorded response for {request.method} {request.url}", request=request)
+        return buffered_response(self, request, entry['status'], entry.get('reason', ''),
+                                 _header_pairs(entry['headers']), Archive.content(entry))
+
+
+# Archives are loaded once per path and shared (read-only; each ReplayAdapter has its own cursor)
+_archives: Dict[str, Archive] = {}
+_archives_lock = threading.Lock()
+
+
+def load_archive(path: str) -> Archive:
+    with _archives_lock:
+        if path not in _archives:
+            _archives[path] = Archive.load(path)
+        return _archives[path]
+
+
+def parse_spec(spec: Optional[str]) -> Tuple[str, Optional[str]]:
+    """Split 'record:PATH' / 'replay:PATH' / 'live' into (mode, path)"""
+    spec = (spec if spec is not None else os.getenv("SANMAR_TRANSPORT", "")).strip()
+    if not spec or spec == 'live':
+        return 'live', None
+    mode, _, path = spec.partition(':')
+    if mode not in ('record', 'replay') or not path:
+        raise ValueError(f"Invalid transport spec {spec!r}; expected 'live', 'record:PATH' or 'replay:PATH'")
+    return mode, path
+
+
+def configure_session(session: requests.Session, spec: Optional[str] = None, backend: Optional[str] = None) -> str:
+    """
+    Mount the transport described by ``spec`` (or SANMAR_TRANSPORT) and return its mode.
+    ``backend`` (or SANMAR_HTTP_BACKEND) picks the wire protocol for live and recorded
+    traffic: 'requests' (HTTP/1.1, default), 'http2' or 'h2c'; see app.http2.
+    """
+    mode, path = parse_spec(spec)
+    if mode == 'replay':
+        adapter = ReplayAdapter(load_archive(path))
+    else:
+        # Imported lazily: app.http2 builds on this module
+        from app.http2 import backend_adapter
+        _, base = backend_adapter(backend if backend is not None else os.getenv("SANMAR_HTTP_BACKEND"))
+        adapter = RecordingAdapter(path, inner=base) if mode == 'record' else base
+        if adapter is None:
+            return mode
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return mode
+
+
+def save_recordings(session: requests.Session):
+    """Flush any recording adapters mounted on ``session`` to disk"""
+    for adapter in set(session.adapters.values()):
+        if isinstance(adapter, RecordingAdapter):
+            adapter.save()
@@ -0,0 +1,82 @@
+"""
+Adaptive vs fixed request concurrency against a rate-limited local SanMar stand-in.
+
+Each strategy runs one full automation (login, search, inventory for every product). The
+stand-in answers 429 once more than ``--capacity`` inventory requests are in flight and
+slows down as it fills up, like a busy upstream.
+
+    python -m benchmarks.bench_concurrency --products 60 --latency 0.1 --capacity 6
+
+Reports wall time, products fetched, 429s seen by the server, and the adaptive limiter's
+final limit, peak in-flight requests and number of decisions.
+"""
+from __future__ import annotations
+import argparse
+import json
+import time
+import urllib.request
+from typing import Dict, Optional
+
+from benchmarks.sanmar_standin import start_in_subprocess
+
+
+def _stats(base_url: str) -> Dict[str, int]:
+    with urllib.request.urlopen(f"{base_url}/__stats", timeout=10) as response:
+        return json.loads(response.read())
+
+
+def run(base_url: str, fixed: Optional[int], maximum: int) -> Dict:
+    from app.concurrency import AdaptiveLimiter
+    from app.sanmar_automation import SanMarAutomation
+
+    automation = SanMarAutomation(base_url=base_url, transport='live', max_concurrency=maximum)
+    if fixed is not None:
+        # minimum == maximum pins the limit
+        automation.limiter = AdaptiveLimiter(maximum=fixed, initial=fixed, minimum=fixed)
+    before = _stats(base_url)
+    start = time.perf_counter()
+    results = automation.run_full_automation('bench', 'bench', 'polo')
+    wall = time.perf_counter() - start
+    automation.close()
+    after = _stats(base_url)
+    snapshot = automation.limiter.snapshot()
+    return {
+        'strategy': f"fixed {fixed}" if fixed is not None else f"adaptive <= {maximum}",
+        'wall_s': wall,
+        'products': len(results),
+        'requests': after.get('checkInventoryJson', 0) - before.get('checkInventoryJson', 0),
+        'throttled': after.get('429', 0) - before.get('429', 0),
+        'final_limit': snapshot['limit'],
+        'peak_in_flight': snapshot['peak_in_flight'],
+        'decisions': automation.limiter.decisions,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=60)
+    parser.add_argument("--latency", type=float, default=0.1, help="Stand-in latency per request (seconds)")
+    parser.add_argument("--capacity", type=int, default=6, help="In-flight inventory requests before 429s")
+    parser.add_argument("--fixed", type=int, nargs='*', default=[1, 4, 16], help="Fixed limits to compare")
+    parser.add_argument("--max-concurrency", type=int, default=16, help="Ceiling for the adaptive limiter")
+    parser.add_argument("--decisions", action="store_true", help="Print the adaptive limiter's decisions")
+    args = parser.parse_args()
+
+    process, base_url = start_in_subprocess(products=args.products, latency=args.latency, capacity=args.capacity)
+    try:
+        print(f"stand-in: {args.products} products, latency {args.latency}s, capacity {args.capacity}")
+        print(f"{'strategy':>15} {'wall s':>8} {'products':>9} {'requests':>9} {'429s':>6} {'limit':>6} {'peak':>5}")
+        reports = [run(base_url, fixed, fixed) for fixed in args.fixed]
+        reports.append(run(base_url, None, args.max_concurrency))
+        for report in reports:
+            print(f"{report['strategy']:>15} {report['wall_s']:>8.2f} {report['products']:>9} {report['requests']:>9} "
+                  f"{report['throttled']:>6} {report['final_limit']:>6} {report['peak_in_flight']:>5}")
+        if args.decisions:
+            for decision in reports[-1]['decisions']:
+                print(f"  {decision['time']:>7.2f}s  {decision['from']:>2} -> {decision['to']:<2}  {decision['reason']}")
+    finally:
+        process.terminate()
+
+
+if __name__ == "__main__":
+    main()
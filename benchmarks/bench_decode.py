@@ -0,0 +1,68 @@
+"""
+Throughput of the inventory decode stage as worker processes are added.
+
+Usage:
+    python -m benchmarks.bench_decode [--payloads 400] [--max-workers N]
+
+Decodes copies of the bundled response.json fixture (a real ~90 KB
+checkInventoryJson body) inline and through app.decode.InventoryDecoder with
+1..N worker processes, and prints payloads/s and speedup over the inline run.
+"""
+from __future__ import annotations
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from pathlib import Path
+
+from app.decode import JSON_BACKEND, InventoryDecoder, decode_inventory
+from app.processing import process_inventory_data
+
+FIXTURE = Path(__file__).resolve().parent.parent / "response.json"
+
+
+def _run_inline(payloads, loader) -> float:
+    start = time.perf_counter()
+    for i, raw in enumerate(payloads):
+        loader(raw, f"fixture-{i}")
+    return time.perf_counter() - start
+
+
+def _run_pool(payloads, workers: int) -> float:
+    with InventoryDecoder(workers=workers) as decoder:
+        # Warm the pool so process start-up is not counted
+        for future in [decoder.submit(payloads[0], "warmup") for _ in range(workers)]:
+            future.result()
+        start = time.perf_counter()
+        futures = [decoder.submit(raw, f"fixture-{i}") for i, raw in enumerate(payloads)]
+        for future in futures:
+            future.result()
+        return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--payloads", type=int, default=400)
+    parser.add_argument("--max-workers", type=int, default=multiprocessing.cpu_count())
+    args = parser.parse_args()
+
+    raw = FIXTURE.read_bytes()
+    payloads = [raw] * args.payloads
+    print(f"fixture: {FIXTURE.name} ({len(raw) / 1024:.1f} KB), payloads: {args.payloads}, "
+          f"cores: {os.cpu_count()}, fast backend: {JSON_BACKEND}")
+
+    stdlib = _run_inline(payloads, lambda b, code: process_inventory_data(json.loads(b), code))
+    inline = _run_inline(payloads, decode_inventory)
+    print(f"{'mode':<16}{'seconds':>10}{'payloads/s':>14}{'speedup':>10}")
+    print(f"{'inline json':<16}{stdlib:>10.3f}{args.payloads / stdlib:>14.1f}{stdlib / stdlib:>10.2f}")
+    print(f"{'inline ' + JSON_BACKEND:<16}{inline:>10.3f}{args.payloads / inline:>14.1f}{stdlib / inline:>10.2f}")
+
+    for workers in range(1, args.max_workers + 1):
+        elapsed = _run_pool(payloads, workers)
+        label = f"pool x{workers}"
+        print(f"{label:<16}{elapsed:>10.3f}{args.payloads / elapsed:>14.1f}{stdlib / elapsed:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
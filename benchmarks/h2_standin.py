@@ -0,0 +1,166 @@
+"""
+HTTP/2 (h2c, prior knowledge) variant of the local SanMar stand-in, built on the h2 library.
+
+Serves the same endpoints and payloads as benchmarks/sanmar_standin.py and reports
+request counts plus the number of TCP connections and HTTP/2 streams at /__stats.
+
+    python -m benchmarks.h2_standin --port 8766 --products 25 --latency 0.05
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import multiprocessing
+from collections import Counter
+from typing import Dict, Optional
+
+import h2.config
+import h2.connection
+import h2.events
+import h2.exceptions
+
+from benchmarks.sanmar_standin import FIXTURE, endpoint_of, respond
+
+
+class StandInProtocol(asyncio.Protocol):
+    def __init__(self, server: "H2StandIn"):
+        self.server = server
+        self.conn = h2.connection.H2Connection(h2.config.H2Configuration(client_side=False, header_encoding='utf-8'))
+        self.transport: Optional[asyncio.Transport] = None
+        self.requests: Dict[int, Dict] = {}
+        # stream id -> future resolved when the peer opens the flow-control window
+        self.window_waiters: Dict[int, asyncio.Future] = {}
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.server.counts['__connections'] += 1
+        self.conn.initiate_connection()
+        transport.write(self.conn.data_to_send())
+
+    def connection_lost(self, exc):
+        for waiter in self.window_waiters.values():
+            if not waiter.done():
+                waiter.cancel()
+
+    def data_received(self, data: bytes):
+        try:
+            events = self.conn.receive_data(data)
+        except h2.exceptions.ProtocolError:
+            self.transport.write(self.conn.data_to_send())
+            self.transport.close()
+            return
+        for event in events:
+            if isinstance(event, h2.events.RequestReceived):
+                self.requests[event.stream_id] = {'headers': dict(event.headers), 'body': b''}
+            elif isinstance(event, h2.events.DataReceived):
+                self.requests[event.stream_id]['body'] += event.data
+                self.conn.acknowledge_received_data(event.flow_controlled_length, event.stream_id)
+            elif isinstance(event, h2.events.StreamEnded):
+                request = self.requests.pop(event.stream_id)
+                asyncio.ensure_future(self.handle(event.stream_id, request))
+            elif isinstance(event, h2.events.WindowUpdated):
+                waiters = list(self.window_waiters.values()) if event.stream_id == 0 else \
+                    [self.window_waiters.get(event.stream_id)]
+                for waiter in waiters:
+                    if waiter is not None and not waiter.done():
+                        waiter.set_result(None)
+            elif isinstance(event, h2.events.StreamReset):
+                self.requests.pop(event.stream_id, None)
+        self.transport.write(self.conn.data_to_send())
+
+    async def handle(self, stream_id: int, request: Dict):
+        headers = request['headers']
+        endpoint = endpoint_of(headers.get(':path', '/'))
+        self.server.counts[endpoint] += 1
+        self.server.counts['__streams'] += 1
+        if endpoint == '/__stats':
+            status, body, content_type = 200, json.dumps(self.server.stats()).encode(), 'application/json'
+        else:
+            if self.server.latency:
+                await asyncio.sleep(self.server.latency)
+            status, body, content_type = respond(headers.get(':method', 'GET'), endpoint,
+                                                 self.server.products, self.server.inventory)
+        try:
+            self.conn.send_headers(stream_id, [
+                (':status', str(status)),
+                ('content-type', content_type),
+                ('content-length', str(len(body))),
+                ('set-cookie', 'JSESSIONID=standin; Path=/'),
+            ])
+            await self.send_body(stream_id, body)
+        except h2.exceptions.ProtocolError:
+            # The client went away (or reset the stream) while the response was pending
+            return
+
+    async def send_body(self, stream_id: int, body: bytes):
+        while True:
+            try:
+                window = self.conn.local_flow_control_window(stream_id)
+            except h2.exceptions.StreamClosedError:
+                return
+            chunk_size = min(window, len(body), self.conn.max_outbound_frame_size)
+            if chunk_size <= 0 and body:
+                waiter = asyncio.get_event_loop().create_future()
+                self.window_waiters[stream_id] = waiter
+                try:
+                    await waiter
+                except asyncio.CancelledError:
+                    return
+                finally:
+                    self.window_waiters.pop(stream_id, None)
+                continue
+            chunk, body = body[:chunk_size], body[chunk_size:]
+            self.conn.send_data(stream_id, chunk, end_stream=not body)
+            self.transport.write(self.conn.data_to_send())
+            if not body:
+                return
+
+
+class H2StandIn:
+    def __init__(self, products: int = 25, latency: float = 0.0):
+        self.products = products
+        self.latency = latency
+        self.inventory = FIXTURE.read_bytes()
+        self.counts: Counter = Counter()
+
+    def stats(self) -> Dict[str, int]:
+        stats = dict(self.counts)
+        stats.pop('/__stats', None)
+        return stats
+
+    async def serve(self, port: int = 0, ready=None):
+        loop = asyncio.get_running_loop()
+        server = await loop.create_server(lambda: StandInProtocol(self), '127.0.0.1', port)
+        bound_port = server.sockets[0].getsockname()[1]
+        if ready is not None:
+            ready.put(bound_port)
+        else:
+            print(f"SanMar HTTP/2 stand-in on http://127.0.0.1:{bound_port} (h2c, {self.products} products)")
+        async with server:
+            await server.serve_forever()
+
+
+def _serve(port: int, products: int, latency: float, ready):
+    asyncio.run(H2StandIn(products, latency).serve(port, ready))
+
+
+def start_in_subprocess(products: int = 25, latency: float = 0.0, port: int = 0):
+    """Run the HTTP/2 stand-in in its own process; returns (process, base_url)"""
+    ctx = multiprocessing.get_context("spawn")
+    ready = ctx.Queue()
+    process = ctx.Process(target=_serve, args=(port, products, latency, ready), daemon=True)
+    process.start()
+    return process, f"http://127.0.0.1:{ready.get(timeout=30)}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--products", type=int, default=25)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response")
+    args = parser.parse_args()
+    asyncio.run(H2StandIn(args.products, args.latency).serve(args.port))
+
+
+if __name__ == "__main__":
+    main()
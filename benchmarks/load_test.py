@@ -0,0 +1,208 @@
+"""
+Multi-user load test: N concurrent app sessions in one process against a local SanMar stand-in.
+
+Each simulated session does the server-side work of one "Run Full Automation" click in
+streamlit_app.py. It runs its own SanMarAutomation with the partial-results aggregates,
+builds the export crosstabs and builds the variant index. The stand-in runs in a
+separate process, so the CPU and RSS reported here belong to the app side only.
+
+    python -m benchmarks.load_test --sessions 1 2 4 8 --products 25 --latency 0.05
+    python -m benchmarks.load_test --sessions 8 --json load.json
+
+Reports per-session latency (total and time to first product), process CPU seconds and
+cores used, peak RSS, and upstream request counts per endpoint.
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import resource
+import statistics
+import threading
+import time
+import urllib.request
+from typing import Dict, List, Optional
+
+from benchmarks.sanmar_standin import start_in_subprocess
+
+
+def _rss_bytes() -> int:
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        # ru_maxrss is KiB on Linux (bytes on macOS); good enough as a fallback
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class _RssSampler(threading.Thread):
+    def __init__(self, interval: float = 0.05):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = _rss_bytes()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.peak = max(self.peak, _rss_bytes())
+
+    def stop(self) -> int:
+        self._stop_event.set()
+        self.join()
+        return max(self.peak, _rss_bytes())
+
+
+def _cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _upstream_counts(base_url: str) -> Dict[str, int]:
+    with urllib.request.urlopen(f"{base_url}/__stats", timeout=10) as response:
+        return json.loads(response.read())
+
+
+def run_session(base_url: str, max_concurrency: Optional[int]) -> Dict:
+    """One app session: automation with live aggregates, then export frames and the variant index"""
+    # Imported here so module import cost is not charged to the first session's latency
+    from app.export import EXPORTS, ExportCache
+    from app.live import LiveAggregates
+    from app.query import InventoryIndex
+    from app.sanmar_automation import SanMarAutomation
+
+    start = time.perf_counter()
+    first_result: List[float] = []
+    live = LiveAggregates()
+
+    def on_result(inventory):
+        if not first_result:
+            first_result.append(time.perf_counter() - start)
+        live.add(inventory)
+        live.matrix_frame()
+
+    automation = SanMarAutomation(base_url=base_url, transport='live', max_concurrency=max_concurrency)
+    try:
+        results = automation.run_full_automation('loadtest', 'loadtest', 'polo', on_result=on_result)
+    finally:
+        automation.close()
+    fetched = time.perf_counter() - start
+
+    cache = ExportCache()
+    try:
+        for name in EXPORTS:
+            cache.frame('load', name, results)
+    finally:
+        cache.close()
+    InventoryIndex(results)
+
+    return {
+        'products': len(results),
+        'latency': time.perf_counter() - start,
+        'fetch': fetched,
+        'first_result': first_result[0] if first_result else None,
+    }
+
+
+def run_load(base_url: str, sessions: int, max_concurrency: Optional[int], ramp: float = 0.0) -> Dict:
+    before_counts = _upstream_counts(base_url)
+    sampler = _RssSampler()
+    sampler.start()
+    cpu_start = _cpu_seconds()
+    wall_start = time.perf_counter()
+
+    outcomes: List[Dict] = [{} for _ in range(sessions)]
+
+    def worker(i: int):
+        try:
+            outcomes[i] = run_session(base_url, max_concurrency)
+        except Exception as e:
+            outcomes[i] = {'error': repr(e)}
+
+    threads = []
+    for i in range(sessions):
+        thread = threading.Thread(target=worker, args=(i,), name=f"session-{i}")
+        thread.start()
+        threads.append(thread)
+        if ramp:
+            time.sleep(ramp)
+    for thread in threads:
+        thread.join()
+
+    wall = time.perf_counter() - wall_start
+    cpu = _cpu_seconds() - cpu_start
+    peak_rss = sampler.stop()
+    after_counts = _upstream_counts(base_url)
+    upstream = {key: after_counts.get(key, 0) - before_counts.get(key, 0) for key in after_counts}
+
+    latencies = [o['latency'] for o in outcomes if 'latency' in o]
+    firsts = [o['first_result'] for o in outcomes if o.get('first_result') is not None]
+    return {
+        'sessions': sessions,
+        'errors': [o['error'] for o in outcomes if 'error' in o],
+        'wall_s': wall,
+        'latency_s': {
+            'p50': statistics.median(latencies) if latencies else None,
+            'p95': _percentile(latencies, 95),
+            'max': max(latencies) if latencies else None,
+        },
+        'first_result_s': {
+            'p50': statistics.median(firsts) if firsts else None,
+            'max': max(firsts) if firsts else None,
+        },
+        'cpu_s': cpu,
+        'cpu_cores': cpu / wall if wall else 0.0,
+        'peak_rss_mb': peak_rss / 1024 / 1024,
+        'upstream_requests': upstream,
+        'per_session': outcomes,
+    }
+
+
+def _percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _fmt(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value:.2f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, nargs='+', default=[1, 2, 4, 8],
+                        help="Concurrent session counts to test, one load step each")
+    parser.add_argument("--products", type=int, default=25, help="Products returned by the stand-in search")
+    parser.add_argument("--latency", type=float, default=0.05, help="Stand-in latency per request (seconds)")
+    parser.add_argument("--max-concurrency", type=int, default=None,
+                        help="Ceiling for each session's adaptive in-flight request limit")
+    parser.add_argument("--ramp", type=float, default=0.0, help="Seconds between session starts")
+    parser.add_argument("--json", help="Also write the full report as JSON to this path")
+    args = parser.parse_args()
+
+    process, base_url = start_in_subprocess(products=args.products, latency=args.latency)
+    reports = []
+    try:
+        print(f"stand-in: {base_url}, products: {args.products}, latency: {args.latency}s, cores: {os.cpu_count()}")
+        print(f"{'sessions':>8} {'p50 s':>8} {'p95 s':>8} {'max s':>8} {'first s':>8} "
+              f"{'cpu s':>8} {'cores':>6} {'rss MB':>8}  upstream requests")
+        for sessions in args.sessions:
+            report = run_load(base_url, sessions, args.max_concurrency, args.ramp)
+            reports.append(report)
+            upstream = ", ".join(f"{k}={v}" for k, v in sorted(report['upstream_requests'].items()))
+            print(f"{sessions:>8} {_fmt(report['latency_s']['p50']):>8} {_fmt(report['latency_s']['p95']):>8} "
+                  f"{_fmt(report['latency_s']['max']):>8} {_fmt(report['first_result_s']['p50']):>8} "
+                  f"{report['cpu_s']:>8.2f} {report['cpu_cores']:>6.2f} {report['peak_rss_mb']:>8.1f}  {upstream}")
+            for error in report['errors']:
+                print(f"         error: {error}")
+    finally:
+        process.terminate()
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(reports, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Local stand-in for the sanmar.com endpoints the app uses.
+
+Serves the login page, the login POST, findProducts.json and checkInventoryJson
+(the bundled response.json fixture) with optional per-request latency, and
+counts upstream requests by endpoint (plus TCP connections) at /__stats.
+
+With ``--capacity N`` it behaves like a rate-limited upstream: inventory requests slow
+down as more of them are in flight, and any beyond N get 429 with Retry-After.
+
+    python -m benchmarks.sanmar_standin --port 8765 --products 25 --latency 0.05
+    python -m benchmarks.sanmar_standin --latency 0.1 --capacity 6
+"""
+from __future__ import annotations
+import argparse
+import json
+import multiprocessing
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional
+
+FIXTURE = Path(__file__).resolve().parent.parent / "response.json"
+
+LOGIN_PAGE = b'<html><form><input name="CSRFToken" value="standin-token"></form></html>'
+ACCOUNT_PAGE = b'<html><a href="/logout">Logout</a> My Account</html>'
+
+
+def respond(method: str, endpoint: str, products: int, inventory: bytes):
+    """(status, body, content type) for a stand-in endpoint; shared with the HTTP/2 stand-in"""
+    if method == 'GET' and endpoint == 'checkInventoryJson':
+        return 200, inventory, 'application/json'
+    if method == 'GET' and endpoint == '/login':
+        return 200, LOGIN_PAGE, 'text/html'
+    if method == 'POST' and endpoint == '/j_spring_security_check':
+        return 200, ACCOUNT_PAGE, 'text/html'
+    if method == 'POST' and endpoint == '/search/findProducts.json':
+        results = [
+            {'code': f"{13774 + i}_TeamRed", 'name': f"Stand-in Polo {i}", 'url': f"/p/{13774 + i}_TeamRed"}
+            for i in range(products)
+        ]
+        return 200, json.dumps({'results': results}).encode(), 'application/json'
+    return 404, b'{}', 'application/json'
+
+
+def endpoint_of(path: str) -> str:
+    path = path.split('?')[0]
+    if path.endswith('/checkInventoryJson'):
+        return 'checkInventoryJson'
+    return path
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    # Set on the class by make_server
+    inventory: bytes = b''
+    products: int = 0
+    latency: float = 0.0
+    capacity: int = 0
+    in_flight: int = 0
+    counts: Counter = Counter()
+    lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with self.lock:
+            self.counts['__connections'] += 1
+
+    def _send(self, status: int, body: bytes, content_type: str = 'application/json'):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Set-Cookie', 'JSESSIONID=standin; Path=/')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _count(self):
+        endpoint = endpoint_of(self.path)
+        with self.lock:
+            self.counts[endpoint] += 1
+        if self.latency and endpoint != '/__stats':
+            time.sleep(self.latency)
+        return endpoint
+
+    def do_GET(self):
+        self._respond('GET')
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        self.rfile.read(length)
+        self._respond('POST')
+
+    def _respond(self, method: str):
+        if self.capacity and endpoint_of(self.path) == 'checkInventoryJson':
+            self._respond_limited(method)
+            return
+        endpoint = self._count()
+        if endpoint == '/__stats':
+            with self.lock:
+                stats = dict(self.counts)
+            stats.pop('/__stats', None)
+            self._send(200, json.dumps(stats).encode())
+            return
+        self._send(*respond(method, endpoint, self.products, self.inventory))
+
+    def _respond_limited(self, method: str):
+        handler = type(self)
+        with self.lock:
+            handler.in_flight += 1
+            in_flight = handler.in_flight
+            self.counts['checkInventoryJson'] += 1
+            if in_flight > self.capacity:
+                self.counts['429'] += 1
+        try:
+            if in_flight > self.capacity:
+                self.send_response(429)
+                self.send_header('Retry-After', '1')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            # Queueing: latency grows once more than half the capacity is busy
+            time.sleep(self.latency * max(1.0, in_flight / max(1, self.capacity / 2)))
+            self._send(*respond(method, 'checkInventoryJson', self.products, self.inventory))
+        finally:
+            with self.lock:
+                handler.in_flight -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(port: int = 0, products: int = 25, latency: float = 0.0, capacity: int = 0) -> ThreadingHTTPServer:
+    handler = type('Handler', (StandInHandler,), {
+        'inventory': FIXTURE.read_bytes(),
+        'products': products,
+        'latency': latency,
+        'capacity': capacity,
+        'in_flight': 0,
+        'counts': Counter(),
+        'lock': threading.Lock(),
+    })
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def _serve(port: int, products: int, latency: float, ready, capacity: int = 0):
+    server = make_server(port, products, latency, capacity)
+    ready.put(server.server_port)
+    server.serve_forever()
+
+
+def start_in_subprocess(products: int = 25, latency: float = 0.0, port: int = 0, capacity: int = 0):
+    """Run the stand-in in its own process so its CPU is not charged to the app; returns (process, base_url)"""
+    ctx = multiprocessing.get_context("spawn")
+    ready = ctx.Queue()
+    process = ctx.Process(target=_serve, args=(port, products, latency, ready, capacity), daemon=True)
+    process.start()
+    bound_port: Optional[int] = ready.get(timeout=30)
+    return process, f"http://127.0.0.1:{bound_port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--products", type=int, default=25)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument("--capacity", type=int, default=0,
+                        help="Concurrent inventory requests served before answering 429 (0 = unlimited)")
+    args = parser.parse_args()
+    server = make_server(args.port, args.products, args.latency, args.capacity)
+    print(f"SanMar stand-in on http://127.0.0.1:{server.server_port} ({args.products} products)")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Checks the HTTP/2 backend against the default one using the local stand-ins.
+
+1. Parity: a full automation run over HTTP/1.1 (requests) and over h2c (HTTP/2 prior
+   knowledge) must produce identical results, product statuses and session cookies.
+2. Concurrency: N threads fetch inventory through one shared session. Reports wall time,
+   per-request latency and how many TCP connections the server accepted.
+
+    python -m benchmarks.verify_http2 --threads 16 --requests 200 --latency 0.05
+"""
+from __future__ import annotations
+import argparse
+import json
+import statistics
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from benchmarks import h2_standin, sanmar_standin
+from benchmarks.load_test import _percentile
+
+
+def _stats(base_url: str, h2c: bool) -> Dict[str, int]:
+    if h2c:
+        # The HTTP/2 stand-in only speaks h2c, so ask it over a throwaway HTTP/2 connection
+        import httpx
+        with httpx.Client(http2=True, http1=False) as client:
+            return client.get(f"{base_url}/__stats").json()
+    with urllib.request.urlopen(f"{base_url}/__stats", timeout=10) as response:
+        return json.loads(response.read())
+
+
+def _delta(before: Dict[str, int], after: Dict[str, int]) -> Dict[str, int]:
+    return {key: after.get(key, 0) - before.get(key, 0) for key in after if after.get(key, 0) != before.get(key, 0)}
+
+
+def full_run(base_url: str, backend: str):
+    from app.sanmar_automation import SanMarAutomation
+
+    automation = SanMarAutomation(base_url=base_url, transport='live', http_backend=backend)
+    results = automation.run_full_automation('verify', 'verify', 'polo')
+    cookies = automation.session.cookies.get_dict()
+    automation.close()
+    return results, automation.product_status, cookies
+
+
+def concurrent_fetch(base_url: str, backend: str, threads: int, requests_count: int) -> Dict:
+    from app.concurrency import AdaptiveLimiter
+    from app.sanmar_automation import SanMarAutomation
+
+    automation = SanMarAutomation(base_url=base_url, transport='live', http_backend=backend)
+    # Pin the in-flight limit so both backends see exactly `threads` concurrent requests
+    automation.limiter = AdaptiveLimiter(maximum=threads, initial=threads, minimum=threads)
+    if backend == 'requests':
+        # Let the default backend open as many pooled connections as there are threads
+        from requests.adapters import HTTPAdapter
+        adapter = HTTPAdapter(pool_connections=threads, pool_maxsize=threads)
+        automation.session.mount('http://', adapter)
+    latencies: List[float] = []
+
+    def fetch(i: int):
+        start = time.perf_counter()
+        result = automation.get_product_inventory(f"{13774 + i % 25}_TeamRed")
+        latencies.append(time.perf_counter() - start)
+        return bool(result.get('variants'))
+
+    before = _stats(base_url, backend == 'h2c')
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        ok = sum(pool.map(fetch, range(requests_count)))
+    wall = time.perf_counter() - wall_start
+    automation.close()
+    upstream = _delta(before, _stats(base_url, backend == 'h2c'))
+    return {
+        'backend': backend,
+        'ok': ok,
+        'wall_s': wall,
+        'p50_ms': statistics.median(latencies) * 1000,
+        'p95_ms': _percentile(latencies, 95) * 1000,
+        'connections': upstream.get('__connections', 0),
+        'requests': upstream.get('checkInventoryJson', 0),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200, help="Inventory requests in the concurrency check")
+    parser.add_argument("--products", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.05, help="Stand-in latency per request (seconds)")
+    args = parser.parse_args()
+
+    h1_process, h1_url = sanmar_standin.start_in_subprocess(products=args.products, latency=args.latency)
+    h2_process, h2_url = h2_standin.start_in_subprocess(products=args.products, latency=args.latency)
+    try:
+        h1_results, h1_status, h1_cookies = full_run(h1_url, 'requests')
+        h2_results, h2_status, h2_cookies = full_run(h2_url, 'h2c')
+        same = h1_results == h2_results and h1_status == h2_status and h1_cookies == h2_cookies
+        print(f"parity: {'OK' if same else 'MISMATCH'} "
+              f"({len(h1_results)} products, cookies {sorted(h2_cookies)})")
+
+        print(f"{'backend':>9} {'ok':>5} {'wall s':>8} {'p50 ms':>8} {'p95 ms':>8} {'conns':>6} {'requests':>9}")
+        for url, backend in ((h1_url, 'requests'), (h2_url, 'h2c')):
+            report = concurrent_fetch(url, backend, args.threads, args.requests)
+            print(f"{report['backend']:>9} {report['ok']:>5} {report['wall_s']:>8.2f} {report['p50_ms']:>8.1f} "
+                  f"{report['p95_ms']:>8.1f} {report['connections']:>6} {report['requests']:>9}")
+    finally:
+        h1_process.terminate()
+        h2_process.terminate()
+    return 0 if same else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,6 +1,20 @@
+import json
+import os
+import time
+import uuid
 import streamlit as st
 import pandas as pd
+from app.alerts import AlertEngine, CallbackSink, FileSink, ListSink
+from app.concurrency import DEFAULT_MAX_CONCURRENCY
+from app.deadline import Deadline
+from app.export import ExportCache, FORMATS, available_formats, file_name
+from app.http2 import http2_available
+from app.live import LiveAggregates, Throttle
+from app.profiling import RunProfiler, maybe_stage
+from app.query import FIELDS, InventoryIndex
 from app.sanmar_automation import SanMarAutomation
+from app.styles import StyleCache, parse_styles
+from app.transport import save_recordings
 
 # Configure page
 st.set_page_config(
@@ -11,8 +25,113 @@ st.set_page_config(
 )
 
 # Initialize automation
-def init_automation():
-    return SanMarAutomation()
+def init_automation(transport=None, http_backend=None, max_concurrency=None, decode_workers=None):
+    return SanMarAutomation(transport=transport, http_backend=http_backend, style_cache=get_style_cache(),
+                            max_concurrency=max_concurrency, decode_workers=decode_workers)
+
+# Style -> colour map shared by all sessions, so a style is only discovered once
+@st.cache_resource
+def get_style_cache() -> StyleCache:
+    return StyleCache(".sanmar_style_cache.json")
+
+# Per-session cache of export frames and generated files, keyed by run ID
+def get_export_cache() -> ExportCache:
+    if 'export_cache' not in st.session_state:
+        st.session_state['export_cache'] = ExportCache()
+    return st.session_state['export_cache']
+
+def render_live_view(placeholder, live: LiveAggregates):
+    """Redraw the in-progress metrics, stock chart and inventory matrix"""
+    with placeholder.container():
+        st.subheader(f"⏳ Partial results ({live.total_products} products so far)")
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Total Products", live.total_products)
+        with col2:
+            st.metric("Total Variants", live.total_variants)
+        with col3:
+            st.metric("Total Stock", live.total_stock)
+        with col4:
+            st.metric("In Stock", live.in_stock_products)
+        
+        st.bar_chart(live.chart_frame().set_index('Product'))
+        st.dataframe(live.matrix_frame(), use_container_width=True)
+
+def render_filter_panel(run):
+    """Filter/sort controls over the run's indexed variants"""
+    # The index is built once per run and kept with it in session state
+    if 'index' not in run:
+        run['index'] = InventoryIndex(run['results'])
+    index = run['index']
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        sizes = st.multiselect("Size", index.values('size'))
+    with col2:
+        colors = st.multiselect("Color", index.values('color'))
+    with col3:
+        base_products = st.multiselect("Base Product", index.values('base_product'))
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        min_stock = st.number_input("Min stock", min_value=0, value=0, step=10)
+    with col2:
+        max_stock = st.number_input("Max stock (0 = no limit)", min_value=0, value=0, step=10)
+    with col3:
+        warehouse_names = sorted(set(index.warehouse_names.values()))
+        warehouse = st.selectbox("In stock at warehouse", ["Any"] + warehouse_names)
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        sort_field = st.selectbox("Sort by", FIELDS, index=FIELDS.index('stock_level'))
+    with col2:
+        descending = st.checkbox("Descending", value=True)
+    with col3:
+        sold_out_colors = st.checkbox("Only colors sold out in every size")
+    
+    start = time.perf_counter()
+    query = index.query()
+    if sizes:
+        query.where(size=sizes)
+    if colors:
+        query.where(color=colors)
+    if base_products:
+        query.where(base_product=base_products)
+    if min_stock or max_stock:
+        query.stock(min=min_stock or None, max=max_stock or None)
+    if warehouse != "Any":
+        query.warehouse_stock(warehouse, min=1)
+    if sold_out_colors:
+        query.color_stock(max=0)
+    matches = query.sort(sort_field, descending=descending).row_ids()
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    
+    st.caption(f"{len(matches)} of {len(index)} variants matched in {elapsed_ms:.1f} ms (showing up to 1000)")
+    rows = index.rows(matches[:1000])
+    if rows:
+        st.dataframe(pd.DataFrame(rows).drop(columns=['stock_by_location']), use_container_width=True)
+
+def render_export_download(run, name, label):
+    """Format picker plus a download button; the file is generated on first request"""
+    export_cache = get_export_cache()
+    formats = available_formats()
+    fmt = st.selectbox("Format", formats, key=f"export_fmt_{name}", format_func=str.upper)
+    
+    if not export_cache.has_file(run['id'], name, fmt):
+        if not st.button(f"⚙️ Prepare {fmt.upper()}", key=f"export_prepare_{name}", use_container_width=True):
+            return
+        with st.spinner(f"Writing {fmt.upper()} export..."), maybe_stage(run.get('profiler'), f"export:{name}:{fmt}"):
+            export_cache.file(run['id'], name, fmt, run['results'])
+    
+    with open(export_cache.file(run['id'], name, fmt, run['results']), 'rb') as f:
+        st.download_button(
+            label=label,
+            data=f,
+            file_name=file_name(name, fmt, run['query'], run['timestamp']),
+            mime=FORMATS[fmt][2],
+            key=f"export_download_{name}_{fmt}",
+            use_container_width=True
+        )
 
 # Main title
 st.title("🤖 SanMar Product Automation")
@@ -27,11 +146,78 @@ with st.sidebar:
         username = st.text_input("Username:", value="mikehorton")
         password = st.text_input("Password:", value="6432Order", type="password")
     
-    # Category search
-    category_query = st.text_input(
-        "Category to search:",
-        placeholder="e.g., polo, t-shirt, jacket",
-        help="Enter category name to search and check inventory"
+    # Category search, or a list of styles expanded into all their colours
+    search_mode = st.radio(
+        "Find products by:",
+        ["Category search", "Style list"],
+        horizontal=True,
+        help="Style list checks every colour of each style without searching"
+    )
+    if search_mode == "Style list":
+        category_query = st.text_input(
+            "Styles to check:",
+            placeholder="e.g., 13774, NKDC1963, 13774_TeamRed",
+            help="Base products, style numbers or colour codes, separated by commas"
+        )
+    else:
+        category_query = st.text_input(
+            "Category to search:",
+            placeholder="e.g., polo, t-shirt, jacket",
+            help="Enter category name to search and check inventory"
+        )
+    
+    with st.expander("🔁 HTTP Transport", expanded=False):
+        transport_mode = st.radio(
+            "Mode:",
+            ["live", "record", "replay"],
+            horizontal=True,
+            help="Record saves every request/response to an archive; replay serves them offline"
+        )
+        archive_path = st.text_input("Archive path:", value="fixtures/sanmar.jsonl.gz")
+        http_backend = st.selectbox(
+            "HTTP backend:",
+            ["requests", "http2"] if http2_available() else ["requests"],
+            help="http2 multiplexes requests over a few connections (needs httpx[http2])"
+        )
+    
+    time_budget = st.number_input(
+        "Time budget (seconds, 0 = unlimited):",
+        min_value=0,
+        value=0,
+        step=10,
+        help="Stop fetching when the budget is spent and keep the products completed so far"
+    )
+    
+    max_concurrency = st.number_input(
+        "Max concurrent requests:",
+        min_value=1,
+        max_value=32,
+        value=DEFAULT_MAX_CONCURRENCY,
+        help="Ceiling for the adaptive limit, which grows while SanMar responds quickly and backs off on throttling"
+    )
+    
+    decode_workers = st.number_input(
+        "Decode worker processes:",
+        min_value=0,
+        max_value=os.cpu_count() or 1,
+        value=min(int(os.getenv("SANMAR_DECODE_WORKERS") or 0), os.cpu_count() or 1),
+        help="Parse inventory JSON in a process pool instead of the fetch threads (0 = inline)"
+    )
+    
+    with st.expander("🚨 Alert Rules", expanded=False):
+        alert_rules_text = st.text_area(
+            "Rules (JSON list):",
+            value="",
+            placeholder='[{"type": "variant_below", "threshold": 20, "size": "XL"}]',
+            help="Types: variant_below, warehouse_sold_out, total_drop (see app/alerts.py)"
+        )
+        alert_state_path = st.text_input("State file:", value=".sanmar_alert_state.json",
+                                         help="Remembers totals and active alerts between runs")
+        alert_log_path = st.text_input("Alert log (JSON lines, optional):", value="")
+    
+    profile_run = st.checkbox(
+        "🧪 Profile this run",
+        help="Record a CPU profile and memory allocations for the run and any exports"
     )
     
     # Automation button
@@ -40,226 +226,258 @@ with st.sidebar:
 # Main content area
 if automation_button and category_query and username and password:
     # Initialize automation
-    automation = init_automation()
+    try:
+        automation = init_automation(
+            "live" if transport_mode == "live" else f"{transport_mode}:{archive_path}",
+            http_backend,
+            int(max_concurrency),
+            int(decode_workers)
+        )
+    except (OSError, ValueError, ImportError) as e:
+        st.error(f"Could not set up {transport_mode} transport: {e}")
+        st.stop()
+    
+    # Alert engine; rules are compiled once per run
+    alert_sink = ListSink()
+    alert_engine = None
+    if alert_rules_text.strip():
+        try:
+            sinks = [alert_sink, CallbackSink(lambda alert: st.toast(f"🚨 {alert['message']}"))]
+            if alert_log_path:
+                sinks.append(FileSink(alert_log_path))
+            alert_engine = AlertEngine(json.loads(alert_rules_text), sinks=sinks, state_path=alert_state_path or None)
+        except (ValueError, KeyError, OSError) as e:
+            st.error(f"Invalid alert rules: {e}")
+            st.stop()
+    
+    # Partial results view, refreshed in throttled batches while the run is in progress
+    live_view = st.empty()
+    live = LiveAggregates()
+    refresh = Throttle(interval=1.5)
+    
+    def show_partial_result(inventory):
+        live.add(inventory)
+        if refresh.ready():
+            render_live_view(live_view, live)
     
     # Run the full automation
-    results = automation.run_full_automation(username, password, category_query)
+    profiler = RunProfiler() if profile_run else None
+    try:
+        with maybe_stage(profiler, "automation"):
+            if search_mode == "Style list":
+                results = automation.run_style_automation(
+                    username, password, parse_styles(category_query),
+                    on_result=show_partial_result,
+                    deadline=Deadline(time_budget or None),
+                    alerts=alert_engine
+                )
+            else:
+                results = automation.run_full_automation(
+                    username, password, category_query,
+                    on_result=show_partial_result,
+                    deadline=Deadline(time_budget or None),
+                    alerts=alert_engine
+                )
+    finally:
+        save_recordings(automation.session)
+        # Release the session's connections (and the HTTP/2 backend's event-loop thread) and decode pool
+        automation.close()
+    live_view.empty()
     
     if results:
-        st.success(f"✅ Automation completed! Found inventory data for {len(results)} products")
-        
-        # Display results in tabs
-        tab1, tab2, tab3 = st.tabs(["📊 Summary", "📋 Detailed View", "📥 Export Data"])
+        # Keep the run across reruns so widget interactions don't discard it
+        run_id = uuid.uuid4().hex
+        st.session_state['run'] = {
+            'id': run_id,
+            'query': category_query,
+            'results': results,
+            'timestamp': pd.Timestamp.now().strftime('%Y%m%d_%H%M%S'),
+            'profiler': profiler,
+            'product_status': dict(automation.product_status),
+            'alerts': alert_sink.alerts,
+            'concurrency': automation.limiter.snapshot(),
+            'concurrency_decisions': list(automation.limiter.decisions),
+        }
+        get_export_cache().keep_only(run_id)
+    else:
+        st.session_state.pop('run', None)
+        st.error("❌ Automation failed. Please check your credentials and try again.")
+
+elif automation_button:
+    if not category_query:
+        st.error("Please enter a category to search" if search_mode == "Category search" else "Please enter styles to check")
+    if not username or not password:
+        st.error("Please enter your SanMar login credentials")
+
+run = st.session_state.get('run')
+if run:
+    results = run['results']
+    
+    if run.get('profiler') is not None:
+        with st.sidebar.expander("🧪 Profiling Output", expanded=True):
+            for stage, seconds in run['profiler'].timings.items():
+                st.write(f"**{stage}:** {seconds:.2f}s")
+            for artifact, data in run['profiler'].artifacts().items():
+                st.download_button(
+                    label=f"📥 {artifact}",
+                    data=data,
+                    file_name=f"sanmar_{run['timestamp']}_{artifact}",
+                    key=f"profile_download_{artifact}",
+                    use_container_width=True
+                )
+
+    st.success(f"✅ Automation completed! Found inventory data for {len(results)} products")
+    
+    if run.get('alerts'):
+        with st.expander(f"🚨 {len(run['alerts'])} new alerts", expanded=True):
+            st.dataframe(
+                pd.DataFrame(run['alerts'])[['message', 'rule_id', 'product_code', 'value']],
+                use_container_width=True
+            )
+    
+    if run.get('concurrency'):
+        concurrency = run['concurrency']
+        with st.expander(f"🚦 Request concurrency: limit {concurrency['limit']}/{concurrency['maximum']}, "
+                         f"peak {concurrency['peak_in_flight']} in flight"):
+            st.write(
+                f"**Responses:** {concurrency['ok']} ok, {concurrency['slow']} slow, "
+                f"{concurrency['throttled']} throttled, {concurrency['errors']} errors"
+                + (f" · **baseline latency:** {concurrency['baseline_ms']} ms" if concurrency['baseline_ms'] else "")
+            )
+            if run['concurrency_decisions']:
+                st.dataframe(pd.DataFrame(run['concurrency_decisions']), use_container_width=True)
+    
+    incomplete = {code: outcome for code, outcome in run.get('product_status', {}).items() if outcome != 'ok'}
+    if incomplete:
+        counts = pd.Series(list(incomplete.values())).value_counts()
+        st.warning(
+            "⏱️ Partial results: " + ", ".join(f"{count} {outcome.replace('_', ' ')}" for outcome, count in counts.items())
+        )
+        with st.expander("Products without inventory"):
+            st.dataframe(
+                pd.DataFrame({'Product Code': list(incomplete), 'Status': list(incomplete.values())}),
+                use_container_width=True
+            )
+    
+    # Display results in tabs
+    tab1, tab2, tab3, tab4 = st.tabs(["📊 Summary", "📋 Detailed View", "📥 Export Data", "🔎 Filter Variants"])
+    
+    with tab1:
+        # Summary statistics
+        col1, col2, col3, col4 = st.columns(4)
         
-        with tab1:
-            # Summary statistics
-            col1, col2, col3, col4 = st.columns(4)
-            
-            total_products = len(results)
-            total_variants = sum(len(r.get('variants', [])) for r in results)
-            total_stock = sum(r.get('total_stock', 0) for r in results)
-            in_stock_products = sum(1 for r in results if r.get('total_stock', 0) > 0)
-            
-            with col1:
-                st.metric("Total Products", total_products)
-            with col2:
-                st.metric("Total Variants", total_variants)
-            with col3:
-                st.metric("Total Stock", total_stock)
-            with col4:
-                st.metric("In Stock", in_stock_products)
-            
-            # Stock distribution chart
-            if results:
-                stock_data = [r.get('total_stock', 0) for r in results]
-                product_names = [r.get('product_name', r.get('name', 'Unknown'))[:30] + "..." 
-                               if len(r.get('product_name', r.get('name', 'Unknown'))) > 30 
-                               else r.get('product_name', r.get('name', 'Unknown')) 
-                               for r in results]
-                
-                df_chart = pd.DataFrame({
-                    'Product': product_names,
-                    'Total Stock': stock_data
-                })
-                
-                st.subheader("📈 Stock Levels by Product")
-                st.bar_chart(df_chart.set_index('Product'))
+        total_products = len(results)
+        total_variants = sum(len(r.get('variants', [])) for r in results)
+        total_stock = sum(r.get('total_stock', 0) for r in results)
+        in_stock_products = sum(1 for r in results if r.get('total_stock', 0) > 0)
         
-        with tab2:
-            # Detailed view of each product
-            st.subheader("📋 Product Inventory Details")
-            
-            for result in results:
-                with st.expander(
-                    f"🏷️ {result.get('product_name', result.get('name', 'Unknown'))} "
-                    f"(Stock: {result.get('total_stock', 0)})", 
-                    expanded=False
-                ):
-                    col1, col2 = st.columns([1, 1])
-                    
-                    with col1:
-                        st.write(f"**Product Code:** {result.get('product_code', result.get('code', 'N/A'))}")
-                        st.write(f"**Base Product:** {result.get('base_product', 'N/A')}")
-                        st.write(f"**Total Stock:** {result.get('total_stock', 0)}")
-                        st.write(f"**Number of Variants:** {len(result.get('variants', []))}")
-                        
-                        if result.get('url'):
-                            st.write(f"**URL:** {result.get('url', 'N/A')}")
-                    
-                    with col2:
-                        # Variants table
-                        if result.get('variants'):
-                            variants_df = pd.DataFrame(result['variants'])
-                            if not variants_df.empty:
-                                st.write("**Variants:**")
-                                # Select relevant columns for display
-                                display_cols = ['size', 'color', 'stock_level']
-                                available_cols = [col for col in display_cols if col in variants_df.columns]
-                                if available_cols:
-                                    st.dataframe(variants_df[available_cols], use_container_width=True)
+        with col1:
+            st.metric("Total Products", total_products)
+        with col2:
+            st.metric("Total Variants", total_variants)
+        with col3:
+            st.metric("Total Stock", total_stock)
+        with col4:
+            st.metric("In Stock", in_stock_products)
         
-        with tab3:
-            # Export functionality
-            st.subheader("📥 Export Data")
-            
-            # Format data for export
-            formatted_results = automation.format_results_for_display(results)
-            
-            # Create detailed data for crosstab
-            detailed_data = []
+        # Stock distribution chart
+        if results:
+            stock_data = [r.get('total_stock', 0) for r in results]
+            product_names = [r.get('product_name', r.get('name', 'Unknown'))[:30] + "..." 
+                           if len(r.get('product_name', r.get('name', 'Unknown'))) > 30 
+                           else r.get('product_name', r.get('name', 'Unknown')) 
+                           for r in results]
             
-            for result in formatted_results:
-                # Detailed rows for each variant
-                for variant in result.get('Variants', []):
-                    detailed_data.append({
-                        'Product Code': result['Product Code'],
-                        'Product Name': result['Product Name'],
-                        'Base Product': result['Base Product'],
-                        'Variant Code': variant['Variant Code'],
-                        'Size': variant['Size'],
-                        'Color': variant['Color'],
-                        'Stock Level': variant['Stock Level'],
-                        'URL': result['URL']
-                    })
+            df_chart = pd.DataFrame({
+                'Product': product_names,
+                'Total Stock': stock_data
+            })
             
-            if detailed_data:
-                detailed_df = pd.DataFrame(detailed_data)
-                
-                # Crosstab Format Options
-                st.write("**📊 Crosstab Export Options:**")
-                
-                col1, col2 = st.columns(2)
+            st.subheader("📈 Stock Levels by Product")
+            st.bar_chart(df_chart.set_index('Product'))
+    
+    with tab2:
+        # Detailed view of each product
+        st.subheader("📋 Product Inventory Details")
+        
+        for result in results:
+            with st.expander(
+                f"🏷️ {result.get('product_name', result.get('name', 'Unknown'))} "
+                f"(Stock: {result.get('total_stock', 0)})", 
+                expanded=False
+            ):
+                col1, col2 = st.columns([1, 1])
                 
                 with col1:
-                    st.write("**Format 1: Size × Color Combinations**")
-                    
-                    # Create a combination column for Size-Color
-                    df_copy1 = detailed_df.copy()
-                    df_copy1['Size_Color'] = df_copy1['Size'].astype(str) + ' - ' + df_copy1['Color'].astype(str)
-                    
-                    # Create crosstab with product info as index and size-color combinations as columns
-                    crosstab_df1 = df_copy1.pivot_table(
-                        index=['Product Code', 'Product Name', 'Base Product', 'URL'],
-                        columns='Size_Color',
-                        values='Stock Level',
-                        fill_value=0,
-                        aggfunc='sum'
-                    ).reset_index()
+                    st.write(f"**Product Code:** {result.get('product_code', result.get('code', 'N/A'))}")
+                    st.write(f"**Base Product:** {result.get('base_product', 'N/A')}")
+                    st.write(f"**Total Stock:** {result.get('total_stock', 0)}")
+                    st.write(f"**Number of Variants:** {len(result.get('variants', []))}")
                     
-                    # Display sample of the crosstab
-                    st.dataframe(crosstab_df1.head(3), use_container_width=True)
-                    
-                    # Download button
-                    csv_crosstab1 = crosstab_df1.to_csv(index=False)
-                    st.download_button(
-                        label="📥 Download Size×Color Crosstab",
-                        data=csv_crosstab1,
-                        file_name=f"sanmar_crosstab_size_color_{category_query}_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                        mime="text/csv",
-                        use_container_width=True
-                    )
+                    if result.get('url'):
+                        st.write(f"**URL:** {result.get('url', 'N/A')}")
                 
                 with col2:
-                    st.write("**Format 2: Sizes as Columns, Products×Colors as Rows**")
-                    
-                    # Create crosstab with sizes as columns
-                    df_copy2 = detailed_df.copy()
-                    df_copy2['Product_Color'] = df_copy2['Product Code'] + ' - ' + df_copy2['Color'].astype(str)
-                    
-                    crosstab_df2 = df_copy2.pivot_table(
-                        index=['Product_Color', 'Product Code', 'Product Name', 'Color'],
-                        columns='Size',
-                        values='Stock Level',
-                        fill_value=0,
-                        aggfunc='sum'
-                    ).reset_index()
-                    
-                    # Display sample of the crosstab
-                    st.dataframe(crosstab_df2.head(3), use_container_width=True)
-                    
-                    # Download button
-                    csv_crosstab2 = crosstab_df2.to_csv(index=False)
-                    st.download_button(
-                        label="📥 Download Product×Size Crosstab",
-                        data=csv_crosstab2,
-                        file_name=f"sanmar_crosstab_product_size_{category_query}_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                        mime="text/csv",
-                        use_container_width=True
-                    )
-                
-                # Comprehensive crosstab format (all products in one table)
-                st.write("**Format 3: Complete Inventory Matrix**")
-                
-                # Create the most comprehensive crosstab
-                df_copy3 = detailed_df.copy()
-                df_copy3['Size_Color'] = df_copy3['Size'].astype(str) + ' (' + df_copy3['Color'].astype(str) + ')'
+                    # Variants table
+                    if result.get('variants'):
+                        variants_df = pd.DataFrame(result['variants'])
+                        if not variants_df.empty:
+                            st.write("**Variants:**")
+                            # Select relevant columns for display
+                            display_cols = ['size', 'color', 'stock_level']
+                            available_cols = [col for col in display_cols if col in variants_df.columns]
+                            if available_cols:
+                                st.dataframe(variants_df[available_cols], use_container_width=True)
+    
+    with tab3:
+        # Export functionality
+        st.subheader("📥 Export Data")
+        
+        # Frames are pivoted once per run; files are only written when requested
+        export_cache = get_export_cache()
+        detailed_df = export_cache.frame(run['id'], 'detailed', results)
+        
+        if not detailed_df.empty:
+            # Crosstab Format Options
+            st.write("**📊 Crosstab Export Options:**")
+            
+            col1, col2 = st.columns(2)
+            
+            with col1:
+                st.write("**Format 1: Size × Color Combinations**")
                 
-                crosstab_df3 = df_copy3.pivot_table(
-                    index=['Product Code', 'Product Name'],
-                    columns='Size_Color',
-                    values='Stock Level',
-                    fill_value=0,
-                    aggfunc='sum'
-                ).reset_index()
+                # Display sample of the crosstab
+                crosstab_df1 = export_cache.frame(run['id'], 'size_color', results)
+                st.dataframe(crosstab_df1.head(3), use_container_width=True)
                 
-                # Add total column
-                size_color_cols = [col for col in crosstab_df3.columns if col not in ['Product Code', 'Product Name']]
-                crosstab_df3['Total Stock'] = crosstab_df3[size_color_cols].sum(axis=1)
+                render_export_download(run, 'size_color', "📥 Download Size×Color Crosstab")
+            
+            with col2:
+                st.write("**Format 2: Sizes as Columns, Products×Colors as Rows**")
                 
-                st.dataframe(crosstab_df3, use_container_width=True)
+                # Display sample of the crosstab
+                crosstab_df2 = export_cache.frame(run['id'], 'product_size', results)
+                st.dataframe(crosstab_df2.head(3), use_container_width=True)
                 
-                # Download button for comprehensive format
-                csv_crosstab3 = crosstab_df3.to_csv(index=False)
-                st.download_button(
-                    label="📥 Download Complete Inventory Matrix",
-                    data=csv_crosstab3,
-                    file_name=f"sanmar_inventory_matrix_{category_query}_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                    mime="text/csv",
-                    use_container_width=True
-                )
+                render_export_download(run, 'product_size', "📥 Download Product×Size Crosstab")
+            
+            # Comprehensive crosstab format (all products in one table)
+            st.write("**Format 3: Complete Inventory Matrix**")
+            
+            crosstab_df3 = export_cache.frame(run['id'], 'matrix', results)
+            st.dataframe(crosstab_df3, use_container_width=True)
+            
+            render_export_download(run, 'matrix', "📥 Download Complete Inventory Matrix")
+            
+            # Traditional detailed format (optional)
+            with st.expander("📋 Traditional Detailed Format"):
+                st.dataframe(detailed_df, use_container_width=True)
                 
-                # Traditional detailed format (optional)
-                with st.expander("📋 Traditional Detailed Format"):
-                    st.dataframe(detailed_df, use_container_width=True)
-                    
-                    # Download button for traditional detailed data
-                    csv_detailed = detailed_df.to_csv(index=False)
-                    st.download_button(
-                        label="📥 Download Traditional Detailed CSV",
-                        data=csv_detailed,
-                        file_name=f"sanmar_inventory_detailed_{category_query}_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                        mime="text/csv",
-                        use_container_width=True
-                    )
-    
-    else:
-        st.error("❌ Automation failed. Please check your credentials and try again.")
+                render_export_download(run, 'detailed', "📥 Download Traditional Detailed Data")
 
-elif automation_button:
-    if not category_query:
-        st.error("Please enter a category to search")
-    if not username or not password:
-        st.error("Please enter your SanMar login credentials")
+    with tab4:
+        st.subheader("🔎 Filter Variants")
+        render_filter_panel(run)
 
 # Information section
 with st.expander("ℹ️ How to use this tool", expanded=False):